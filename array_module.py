@@ -1,12 +1,137 @@
+"""Writing and reading arrays of floats in chunks, in constant memory.
+
+The whole-array version keeps the 10^7 doubles in memory twice (80 MB each).
+ChunkedWriter takes values from any iterable and writes them CHUNK_ITEMS at a
+time, iter_chunks reads a file back through one preallocated buffer with
+readinto, and files_equal/file_checksum compare and hash files block by block,
+so peak memory does not depend on the file size.
+
+    python array_module.py [count]
+
+    chunked      | 10000000 floats | True | peak rss   +3.0 MB | crc32 cca5ad55
+    whole arrays | 10000000 floats | True | peak rss +230.5 MB
+
+The chunked run writes the file, copies it chunk by chunk and compares the
+two; its peak is the same for 10^5 floats. Both runs write to a temporary
+directory, removed at the end. block_float_file.py stores the
+same data with a header, compression and random access.
+"""
+import os
+import sys
+import tempfile
+import zlib
 from array import array
+from itertools import islice
 from random import random
+from typing import Iterable, Iterator
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CHUNK_ITEMS = 2 ** 16
+BLOCK_BYTES = 2 ** 20
+
+
+class ChunkedWriter:
+
+    def __init__(self, path: str, typecode: str = 'd', chunk_items: int = CHUNK_ITEMS):
+        self._file = open(path, mode='wb')
+        self._typecode = typecode
+        self._chunk_items = chunk_items
+        self.count = 0
+
+    def write(self, values: Iterable) -> None:
+        iterator = iter(values)
+        while True:
+            chunk = array(self._typecode, islice(iterator, self._chunk_items))
+            if not chunk:
+                break
+            chunk.tofile(self._file)
+            self.count += len(chunk)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'ChunkedWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def iter_chunks(path: str, typecode: str = 'd', chunk_items: int = CHUNK_ITEMS) -> Iterator[memoryview]:
+    """Views of consecutive chunks of a file, all over the same buffer.
+
+    A view is only valid until the next one is produced; copy it to keep it.
+    """
+    buffer = array(typecode, bytes(array(typecode).itemsize * chunk_items))
+    items = memoryview(buffer)
+    raw = items.cast('B')
+    with open(path, mode='rb') as f:
+        while True:
+            read = f.readinto(raw)
+            if not read:
+                break
+            if read % buffer.itemsize:
+                raise ValueError(f'{path} does not hold whole {typecode!r} items')
+            yield items[:read // buffer.itemsize]
+
+
+def files_equal(path_a: str, path_b: str, block_bytes: int = BLOCK_BYTES) -> bool:
+    buffer_a = bytearray(block_bytes)
+    buffer_b = bytearray(block_bytes)
+    view_a = memoryview(buffer_a)
+    view_b = memoryview(buffer_b)
+    with open(path_a, mode='rb') as file_a, open(path_b, mode='rb') as file_b:
+        while True:
+            read_a = file_a.readinto(view_a)
+            read_b = file_b.readinto(view_b)
+            if read_a != read_b or view_a[:read_a] != view_b[:read_b]:
+                return False
+            if not read_a:
+                return True
+
+
+def file_checksum(path: str, block_bytes: int = BLOCK_BYTES) -> int:
+    """CRC-32 of a file's bytes, read block by block."""
+    buffer = bytearray(block_bytes)
+    view = memoryview(buffer)
+    checksum = 0
+    with open(path, mode='rb') as f:
+        while read := f.readinto(view):
+            checksum = zlib.crc32(view[:read], checksum)
+    return checksum
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return float('nan')
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 7
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'floats.bin')
+
+        rss_before = peak_rss_mb()
+        with ChunkedWriter(path) as writer:
+            writer.write(random() for _ in range(count))
+        with ChunkedWriter(path + '.copy') as writer:
+            for chunk in iter_chunks(path):
+                writer.write(chunk)
+        print(f'chunked      | {count} floats | {files_equal(path, path + ".copy")} | '
+              f'peak rss {peak_rss_mb() - rss_before:+6.1f} MB | crc32 {file_checksum(path):08x}')
 
-floats = array('d', (random() for _ in range(10**7)))
-with open('floats.bin', 'wb') as file:
-    floats.tofile(file)
+        floats = array('d', (random() for _ in range(count)))
+        with open(path, mode='wb') as file:
+            floats.tofile(file)
 
-floats2 = array('d')
-with open('floats.bin', 'rb') as file:
-    floats2.fromfile(file, 10**7)
+        floats2 = array('d')
+        with open(path, mode='rb') as file:
+            floats2.fromfile(file, count)
 
-print(floats == floats2)
+        print(f'whole arrays | {count} floats | {floats == floats2} | '
+              f'peak rss {peak_rss_mb() - rss_before:+6.1f} MB')
@@ -0,0 +1,146 @@
+"""Repeated timing with summary statistics, parallel cells and a JSON history.
+
+measure() warms a function up, picks how many calls go into one sample so
+that a sample is long enough for the clock, and takes as many samples as fit
+a time budget. Summaries carry the per-call samples in ns, so two runs from
+the history can be compared later with Welch's t-test.
+
+Each cell of run_cells() runs in a fresh process (optionally pinned to one
+core, where os.sched_setaffinity exists), so a cell can neither warm the
+allocator nor fill the memory of the next one.
+"""
+import json
+import math
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+WARMUP_NS = 10 ** 8
+MIN_SAMPLE_NS = 10 ** 7
+BUDGET_NS = 2 * 10 ** 9
+MIN_SAMPLES = 5
+MAX_SAMPLES = 30
+REGRESSION_THRESHOLD = .05
+
+# Two-sided 95% quantiles of Student's t by degrees of freedom.
+T_95 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365,
+    8: 2.306, 9: 2.262, 10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086,
+    25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980,
+}
+
+
+def t_critical(df: float) -> float:
+    """95% quantile for df degrees of freedom, rounded to the safe side."""
+    if df < 1:
+        return T_95[1]
+    fitting = [known for known in T_95 if known <= df]
+    return T_95[max(fitting)] if df <= max(T_95) else 1.960
+
+
+def summarize(samples: List[float], loops: int) -> Dict[str, Any]:
+    mean = statistics.fmean(samples)
+    stdev = statistics.stdev(samples) if len(samples) > 1 else 0.
+    return {
+        'samples': samples,
+        'loops': loops,
+        'median': statistics.median(samples),
+        'mean': mean,
+        'stdev': stdev,
+        'ci95': t_critical(len(samples) - 1) * stdev / math.sqrt(len(samples)),
+    }
+
+
+def measure(func: Callable[..., Any], *args,
+            min_sample_ns: int = MIN_SAMPLE_NS, budget_ns: int = BUDGET_NS,
+            min_samples: int = MIN_SAMPLES, max_samples: int = MAX_SAMPLES) -> Dict[str, Any]:
+    """Per-call time of func(*args) in ns, summarized."""
+    # Warmup doubles as calibration: the fastest call sets the loop count.
+    fastest = None
+    warmup_start = time.perf_counter_ns()
+    while True:
+        start_time = time.perf_counter_ns()
+        func(*args)
+        call_time = time.perf_counter_ns() - start_time
+        fastest = call_time if fastest is None else min(fastest, call_time)
+        if start_time + call_time - warmup_start >= WARMUP_NS:
+            break
+    fastest = max(fastest, 1)
+    loops = max(1, -(-min_sample_ns // fastest))
+    samples_count = min(max_samples, max(min_samples, budget_ns // (fastest * loops)))
+
+    samples = []
+    for _ in range(samples_count):
+        start_time = time.perf_counter_ns()
+        for _ in range(loops):
+            func(*args)
+        samples.append((time.perf_counter_ns() - start_time) / loops)
+    return summarize(samples, loops)
+
+
+def welch(old: Dict[str, Any], new: Dict[str, Any]) -> Optional[float]:
+    """Welch's t statistic of new against old, None when the difference is not significant."""
+    old_var = old['stdev'] ** 2 / len(old['samples'])
+    new_var = new['stdev'] ** 2 / len(new['samples'])
+    difference = new['mean'] - old['mean']
+    if not old_var + new_var:
+        return math.copysign(math.inf, difference) if difference else None
+    t = difference / math.sqrt(old_var + new_var)
+    df = (old_var + new_var) ** 2 / (
+        (old_var ** 2 / (len(old['samples']) - 1) if old_var else 0) +
+        (new_var ** 2 / (len(new['samples']) - 1) if new_var else 0)
+    )
+    return t if abs(t) > t_critical(df) else None
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any],
+            threshold: float = REGRESSION_THRESHOLD) -> str:
+    """Verdict on the change of the mean: 'regression', 'improvement' or '~'."""
+    t = welch(old, new)
+    change = new['mean'] / old['mean'] - 1
+    if t is None or abs(change) < threshold:
+        return '~'
+    return 'regression' if change > 0 else 'improvement'
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on; all of them where affinity is unknown."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _pinned(func: Callable[..., Any], cell: Sequence, core: Optional[int]) -> Any:
+    if core is not None:
+        os.sched_setaffinity(0, {core})
+    return func(*cell)
+
+
+def run_cells(func: Callable[..., Any], cells: List[Sequence],
+              jobs: Optional[int] = None, pin: bool = False) -> Iterator[Any]:
+    """Yield func(*cell) for every cell, in order, each one computed in its own process."""
+    cores = sorted(os.sched_getaffinity(0)) if pin and hasattr(os, 'sched_getaffinity') else None
+    with ProcessPoolExecutor(max_workers=jobs or available_cpus(), max_tasks_per_child=1) as pool:
+        futures = [
+            pool.submit(_pinned, func, cell, cores[index % len(cores)] if cores else None)
+            for index, cell in enumerate(cells)
+        ]
+        for future in futures:
+            yield future.result()
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def append_run(path: str, run: Dict[str, Any]) -> None:
+    history = load_history(path)
+    history.append(run)
+    with open(path + '.tmp', mode='w', encoding='utf-8') as f:
+        json.dump(history, f)
+    os.replace(path + '.tmp', path)
@@ -1,26 +1,36 @@
 import bisect
 import sys
 
+import static_sorted_index
+
 HAYSTACK = [1, 4, 5, 6, 8, 12, 15, 20, 21, 23, 23, 26, 29, 30]
 NEEDLES = [0, 1, 2, 5, 8, 10, 22, 23, 29, 30, 31]
 
 ROW_FMT = '{0:5d} @ {1:2d} {2} {0:<2d}'
 
 
-def demo(bisecting_func):
+def demo(bisecting_func, haystack=HAYSTACK):
     for needle in reversed(NEEDLES):
-        position = bisecting_func(HAYSTACK, needle)
+        position = bisecting_func(haystack, needle)
         offset = position * '  |'
         print(ROW_FMT.format(needle, position, offset))
 
 
 if __name__ == '__main__':
 
+    # python bisect_haystack_needles.py [eytzinger] [left]
+    if 'eytzinger' in sys.argv:
+        module = static_sorted_index
+        searched = static_sorted_index.StaticSortedIndex(HAYSTACK, typecode='q')
+    else:
+        module = bisect
+        searched = HAYSTACK
+
     if sys.argv[-1] == 'left':
-        bisect_fn = bisect.bisect_left
+        bisect_fn = module.bisect_left
     else:
-        bisect_fn = bisect.bisect
+        bisect_fn = module.bisect_right
 
-    print('DEMO:', bisect_fn.__name__)
+    print('DEMO:', module.__name__, bisect_fn.__name__)
     print("haystack ->", ' '.join('%2d' % n for n in HAYSTACK))
-    demo(bisect_fn)
+    demo(bisect_fn, searched)
@@ -1,12 +1,22 @@
 import bisect
 import random
+import sys
+from functools import partial
+
+from sorted_list import SortedList
 
 SIZE = 7
 
 random.seed(1729)
 
-my_list = []
+# python bisect_insorting.py [sortedlist]
+if sys.argv[-1] == 'sortedlist':
+    my_list = SortedList()
+    insert = my_list.add
+else:
+    my_list = []
+    insert = partial(bisect.insort, my_list)
 for i in range(SIZE):
     new_item = random.randrange(SIZE*2)
-    bisect.insort(my_list, new_item)
-    print(f'{new_item} ---> {my_list}')
+    insert(new_item)
+    print(f'{new_item} ---> {list(my_list)}')
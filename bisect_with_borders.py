@@ -1,12 +1,147 @@
+"""Scores to letter grades, one at a time and in bulk.
+
+grade_many returns one byte per score: the index of its label. Byte scores
+(array('B'), bytes, 0-255) go through bytes.translate with a 256-entry
+table, numpy arrays through a lookup table for small integers or
+np.searchsorted otherwise, anything else through bisect in a C-level map.
+grade_file streams a binary score file through a fixed buffer, a process
+per slice of the file, into a file of codes.
+
+    python bisect_with_borders.py bench [scores]
+
+10^7 scores 0-100 (array('B')), no numpy, single core:
+
+per-score get_score_in_alpha |    5876150 scores/s
+grade_many                   |  553095693 scores/s
+grade_file                   |   43670645 scores/s
+
+grade_file pays for a disk round trip and the per-label counts; with
+one core its pool is a single worker.
+"""
 import bisect
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import List, Optional, Sequence
+
+from benchmark_runner import available_cpus
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BORDERS = (60, 70, 80, 90)
+LABELS = 'EDCBA'
+CHUNK_ITEMS = 2 ** 20
 
 scores = [45, 99, 76, 67, 80, 95, 82, 55, 100]
 
 
-def get_score_in_alpha(score_to_translate, borders=(60, 70, 80, 90), score_in_alpha='EDCBA'):
+def get_score_in_alpha(score_to_translate, borders=BORDERS, score_in_alpha=LABELS):
     index = bisect.bisect(borders, score_to_translate)
     return score_in_alpha[index]
 
 
-for score in scores:
-    print(get_score_in_alpha(score))
+def grade_many(scores_batch, borders: Sequence = BORDERS, labels: Sequence = LABELS) -> array:
+    """Label index of every score, as array('B'); labels[code] is the grade."""
+    if len(labels) != len(borders) + 1 or len(labels) > 256:
+        raise ValueError('need one label more than borders, and at most 256 labels')
+    is_bytes = isinstance(scores_batch, (bytes, bytearray)) or (
+        isinstance(scores_batch, (array, memoryview))
+        and (scores_batch.typecode if isinstance(scores_batch, array) else scores_batch.format) == 'B'
+    )
+    if is_bytes:
+        table = bytes(bisect.bisect(borders, score) for score in range(256))
+        return array('B', bytes(scores_batch).translate(table))
+    if np is not None:
+        batch = np.asarray(scores_batch)
+        if batch.dtype.kind in 'iu' and batch.size and 0 <= batch.min() and batch.max() < 2 ** 16:
+            table = np.searchsorted(borders, np.arange(batch.max() + 1), side='right').astype(np.uint8)
+            codes = table[batch]
+        else:
+            codes = np.searchsorted(borders, batch, side='right').astype(np.uint8)
+        return array('B', codes.tobytes())
+    return array('B', map(partial(bisect.bisect, borders), scores_batch))
+
+
+def _grade_slice(score_path: str, codes_path: str, typecode: str, start: int, stop: int,
+                 borders: Sequence, labels: Sequence, chunk_items: int) -> List[int]:
+    buffer = array(typecode, bytes(array(typecode).itemsize * chunk_items))
+    raw = memoryview(buffer).cast('B')
+    counts = [0] * len(labels)
+    with open(score_path, mode='rb') as scores_file, open(codes_path, mode='r+b') as codes_file:
+        scores_file.seek(start * buffer.itemsize)
+        codes_file.seek(start)
+        position = start
+        while position < stop:
+            wanted = min(chunk_items, stop - position)
+            read = scores_file.readinto(raw[:wanted * buffer.itemsize]) // buffer.itemsize
+            if not read:
+                break
+            codes = grade_many(memoryview(buffer)[:read], borders, labels)
+            codes_file.write(codes)
+            code_bytes = codes.tobytes()
+            for code in range(len(labels)):
+                counts[code] += code_bytes.count(code)
+            position += read
+    return counts
+
+
+def grade_file(score_path: str, codes_path: str, typecode: str = 'B',
+               borders: Sequence = BORDERS, labels: Sequence = LABELS,
+               chunk_items: int = CHUNK_ITEMS, workers: Optional[int] = None) -> List[int]:
+    """Write one code byte per score of a binary file; returns how many scores got each label."""
+    count = os.path.getsize(score_path) // array(typecode).itemsize
+    with open(codes_path, mode='wb') as codes_file:
+        codes_file.truncate(count)
+    workers = workers or available_cpus()
+    span = -(-count // workers) if count else 0
+    starts = range(0, count, span) if span else []
+    counts = [0] * len(labels)
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [
+            pool.submit(_grade_slice, score_path, codes_path, typecode, start, min(start + span, count),
+                        borders, labels, chunk_items)
+            for start in starts
+        ]
+        for future in futures:
+            counts = [total + part for total, part in zip(counts, future.result())]
+    return counts
+
+
+def bench(count: int) -> None:
+    rnd = random.Random(1729)
+    batch = array('B', rnd.randbytes(count).translate(bytes(byte % 101 for byte in range(256))))
+    start_time = time.perf_counter()
+    expected = [get_score_in_alpha(score) for score in batch]
+    print(f'per-score get_score_in_alpha | {count / (time.perf_counter() - start_time):>10.0f} scores/s')
+
+    start_time = time.perf_counter()
+    codes = grade_many(batch)
+    print(f'grade_many                   | {count / (time.perf_counter() - start_time):>10.0f} scores/s')
+    assert [LABELS[code] for code in codes] == expected
+
+    with tempfile.TemporaryDirectory() as directory:
+        score_path, codes_path = os.path.join(directory, 'scores.bin'), os.path.join(directory, 'codes.bin')
+        with open(score_path, mode='wb') as f:
+            batch.tofile(f)
+        start_time = time.perf_counter()
+        counts = grade_file(score_path, codes_path)
+        print(f'grade_file                   | {count / (time.perf_counter() - start_time):>10.0f} scores/s')
+        with open(codes_path, mode='rb') as f:
+            assert f.read() == codes.tobytes()
+    assert counts == [expected.count(label) for label in LABELS]
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['bench']:
+        bench(int(sys.argv[2]) if len(sys.argv) > 2 else 10 ** 7)
+    else:
+        for score in scores:
+            print(get_score_in_alpha(score))
@@ -1,11 +1,26 @@
-import time
 import collections
-import heapq
 import select
+import selectors
+import time
+from concurrent.futures import Executor
+from socket import socket, socketpair, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
+try:
+    from socket import SO_REUSEPORT
+except ImportError:  # Windows and some older kernels
+    SO_REUSEPORT = None
+
+from typing import Any, Coroutine, Union, Callable, Optional, Dict, List, Tuple
 
-from typing import Any, Coroutine, Union, Callable, Optional
+from scheduler_stats import SchedulerStats
+from timer_wheel import TimerWheel, TimerHandle
 
 SLEEP_TIME = .5
+BUFFER_SIZE = 64 * 1024
+POOLED_BUFFERS = 16
+ECHO_PREFIX = b'Got: '
+
+EVENT_READ = selectors.EVENT_READ
+EVENT_WRITE = selectors.EVENT_WRITE
 
 
 class QueueClosed(Exception):
@@ -17,15 +32,146 @@ class Awaitable:
         yield
 
 
-class Scheduler:
+class BufferPool:
+    """Fixed-size memoryview slices of one preallocated bytearray.
+
+    When all of them are taken, acquire() hands out a standalone buffer; release()
+    keeps at most `count` buffers for reuse and lets the rest go.
+    """
+
+    def __init__(self, buffer_size: int = BUFFER_SIZE, count: int = POOLED_BUFFERS):
+        self._buffer_size = buffer_size
+        self._count = count
+        memory = memoryview(bytearray(buffer_size * count))
+        self._free = [memory[i * buffer_size:(i + 1) * buffer_size] for i in range(count)]
+
+    def acquire(self) -> memoryview:
+        if self._free:
+            return self._free.pop()
+        return memoryview(bytearray(self._buffer_size))
+
+    def release(self, buffer: memoryview) -> None:
+        if len(self._free) < self._count:
+            self._free.append(buffer)
+
+
+class SelectPoller:
+    """Fallback poller. Rebuilds both fd lists and calls select.select on every poll,
+    so it is O(n) in watched descriptors and limited to FD_SETSIZE."""
 
     def __init__(self):
+        self._readers = set()
+        self._writers = set()
+
+    def modify(self, fileobj, events: int) -> None:
+        if events & EVENT_READ:
+            self._readers.add(fileobj)
+        else:
+            self._readers.discard(fileobj)
+        if events & EVENT_WRITE:
+            self._writers.add(fileobj)
+        else:
+            self._writers.discard(fileobj)
+
+    def poll(self, timeout: Optional[float]) -> List[Tuple[Any, int]]:
+        can_read, can_write, _ = select.select(self._readers, self._writers, [], timeout)
+        return [(fileobj, EVENT_READ) for fileobj in can_read] \
+            + [(fileobj, EVENT_WRITE) for fileobj in can_write]
+
+    def close(self) -> None:
+        self._readers.clear()
+        self._writers.clear()
+
+
+class SelectorsPoller:
+    """Persistent registrations on top of selectors (epoll/kqueue where available).
+
+    A descriptor is registered once and only modified when the set of events it is
+    waited for changes, so the cost of a poll depends on the number of ready
+    descriptors, not on the number of watched ones.
+    """
+
+    def __init__(self, selector: Optional[selectors.BaseSelector] = None):
+        self._selector = selector if selector is not None else selectors.DefaultSelector()
+        self._registered: Dict[Any, Tuple[int, int]] = {}  # fileobj -> (fd, events)
+        self._owners: Dict[int, Any] = {}  # fd -> fileobj
+
+    def modify(self, fileobj, events: int) -> None:
+        fd, registered_events = self._registered.get(fileobj, (None, 0))
+        if events == registered_events:
+            return
+        if not events:
+            self._unregister(fileobj, fd)
+            return
+        if fd is not None:
+            self._selector.modify(fd, events, fileobj)
+            self._registered[fileobj] = (fd, events)
+            return
+        fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        stale_owner = self._owners.get(fd)
+        if stale_owner is not None:
+            # The descriptor number got reused after the previous owner was closed.
+            self._unregister(stale_owner, fd)
+        self._selector.register(fd, events, fileobj)
+        self._registered[fileobj] = (fd, events)
+        self._owners[fd] = fileobj
+
+    def _unregister(self, fileobj, fd: int) -> None:
+        del self._registered[fileobj]
+        del self._owners[fd]
+        try:
+            self._selector.unregister(fd)
+        except (KeyError, OSError):
+            pass
+
+    def poll(self, timeout: Optional[float]) -> List[Tuple[Any, int]]:
+        return [(key.data, events) for key, events in self._selector.select(timeout)]
+
+    def close(self) -> None:
+        self._selector.close()
+        self._registered.clear()
+        self._owners.clear()
+
+
+def default_poller() -> Union[SelectorsPoller, SelectPoller]:
+    if hasattr(selectors, 'EpollSelector') or hasattr(selectors, 'KqueueSelector'):
+        return SelectorsPoller()
+    return SelectPoller()
+
+
+class Scheduler:
+
+    def __init__(self, poller: Union[SelectorsPoller, SelectPoller, None] = None):
         self._tasks_ready = collections.deque()
-        self._tasks_delayed = []
-        self._sequence = 0
+        self._tasks_delayed = TimerWheel()
         self._current = None
         self._read_waiting = {}
         self._write_waiting = {}
+        self._poller = poller if poller is not None else default_poller()
+        self._interest_changed = set()
+        # Executor jobs report back through a self-pipe, created on first use.
+        self._wakeup_recv = None
+        self._wakeup_send = None
+        self._executor_done = collections.deque()
+        self._executor_pending = 0
+        self._stats = None
+
+    def set_poller(self, poller: Union[SelectorsPoller, SelectPoller]) -> None:
+        if self._read_waiting or self._write_waiting:
+            raise RuntimeError('cannot swap the poller while descriptors are watched')
+        self._poller.close()
+        self._poller = poller
+
+    def enable_stats(self) -> SchedulerStats:
+        if self._stats is None:
+            self._stats = SchedulerStats()
+        return self._stats
+
+    def disable_stats(self) -> None:
+        self._stats = None
+
+    def get_stats(self) -> Optional[SchedulerStats]:
+        return self._stats
 
     def set_current(self, task: Optional['Task']) -> None:
         self._current = task
@@ -34,25 +180,45 @@ class Scheduler:
         return self._current
 
     def add_to_tasks_ready(self, task: 'Task') -> None:
-        self._tasks_ready.append(task)
-
-    def call_soon(self, func: Callable[[...], Any], delayed: Union[int, float] = 0) -> None:
-        ready = not bool(delayed)
-        if delayed:
-            self._sequence += 1
-            deadline = time.time() + delayed
-            heapq.heappush(
-                self._tasks_delayed,
-                (deadline, self._sequence, func)
-            )
-        if ready:
-            self._tasks_ready.append(func)
+        self._tasks_ready.append((task, ()))
+
+    def call_soon(self, func: Callable[..., Any], *args) -> None:
+        # (func, args) pairs come from the interpreter's tuple free list, which beats
+        # both a closure per call and a free list of handle objects kept in Python.
+        self._tasks_ready.append((func, args))
+
+    def call_later(self, delay: Union[int, float], func: Callable[..., Any], *args) -> TimerHandle:
+        if delay <= 0:
+            # The wheel links at least a tick ahead; a due call goes straight to the ready queue.
+            handle = TimerHandle(0, func, args, self._tasks_delayed)
+            self.call_soon(handle)
+            return handle
+        return self._tasks_delayed.call_later(delay, func, *args)
 
     def read_wait(self, fileno, func):
         self._read_waiting[fileno] = func
+        self._interest_changed.add(fileno)
 
     def write_wait(self, fileno, func):
         self._write_waiting[fileno] = func
+        self._interest_changed.add(fileno)
+
+    def cancel_wait(self, fileno) -> None:
+        self._read_waiting.pop(fileno, None)
+        self._write_waiting.pop(fileno, None)
+        self._interest_changed.add(fileno)
+
+    def _update_poller(self) -> None:
+        # Interest is only pushed to the poller right before it is polled, so a socket
+        # that goes from recv straight to another recv is never touched in between.
+        for fileobj in self._interest_changed:
+            events = 0
+            if fileobj in self._read_waiting:
+                events |= EVENT_READ
+            if fileobj in self._write_waiting:
+                events |= EVENT_WRITE
+            self._poller.modify(fileobj, events)
+        self._interest_changed.clear()
 
     def run(self) -> None:
 
@@ -63,49 +229,57 @@ class Scheduler:
                 or self._write_waiting
         ):
 
+            stats = self._stats
             if not self._tasks_ready:
-                if self._tasks_delayed:
-                    deadline, _, task = self._tasks_delayed[0]
-                    timeout = deadline - time.time()
-                    if timeout < 0:
-                        timeout = 0
-                if not self._tasks_delayed:
-                    timeout = None
-                can_read, can_write, _ = select.select(
-                    self._read_waiting,
-                    self._write_waiting,
-                    [],
-                    timeout
-                )
-                for file_descriptor in can_read:
-                    self._tasks_ready.append(self._read_waiting.pop(file_descriptor))
-                for file_descriptor in can_write:
-                    self._tasks_ready.append(self._write_waiting.pop(file_descriptor))
+                timeout = self._tasks_delayed.next_timeout()
+                self._update_poller()
+                if stats is None:
+                    ready_events = self._poller.poll(timeout)
+                else:
+                    stats.delayed_size.record(len(self._tasks_delayed))
+                    poll_start = time.perf_counter_ns()
+                    ready_events = self._poller.poll(timeout)
+                    stats.poll_time.record((time.perf_counter_ns() - poll_start) // 1000)
+                for file_descriptor, events in ready_events:
+                    if events & EVENT_READ and file_descriptor in self._read_waiting:
+                        self._tasks_ready.append((self._read_waiting.pop(file_descriptor), ()))
+                        self._interest_changed.add(file_descriptor)
+                    if events & EVENT_WRITE and file_descriptor in self._write_waiting:
+                        self._tasks_ready.append((self._write_waiting.pop(file_descriptor), ()))
+                        self._interest_changed.add(file_descriptor)
 
                 # Check for sleeping
-                now = time.time()
-                while self._tasks_delayed:
-                    if now < self._tasks_delayed[0][0]:
-                        break
-                    self._tasks_ready.append(heapq.heappop(self._tasks_delayed)[2])
-
-
-            while self._tasks_ready:
-                task = self._tasks_ready.popleft()
-                task()
+                if stats is None:
+                    self._tasks_ready.extend((timer, ()) for timer in self._tasks_delayed.expire())
+                else:
+                    now = time.monotonic()
+                    for timer in self._tasks_delayed.expire(now):
+                        stats.loop_lag.record(max(0, int((now - timer.when()) * 1e6)))
+                        self._tasks_ready.append((timer, ()))
+
+            if stats is not None:
+                stats.ready_depth.record(len(self._tasks_ready))
+                batch_start = time.perf_counter_ns()
+            ready = self._tasks_ready
+            while ready:
+                func, args = ready.popleft()
+                func(*args)
+            if stats is not None:
+                stats.batch_time.record((time.perf_counter_ns() - batch_start) // 1000)
 
     def add_task(self, coro: Coroutine[Any, Any, Any]) -> None:
-        self._tasks_ready.append(Task(coro))
+        self._tasks_ready.append((Task(coro), ()))
 
     @staticmethod
     def switch() -> Awaitable:
         return Awaitable()
 
     async def sleep(self, delay):
-        self.call_soon(
-            func=self._current,
-            delayed=delay
-        )
+        if delay <= 0:
+            # Just yield: the task stays current and goes back on the ready queue.
+            await self.switch()
+            return
+        self.call_later(delay, self._current)
         self._current = None
         await self.switch()
 
@@ -121,14 +295,91 @@ class Scheduler:
         await self.switch()
         return sock.send(data)
 
+    async def recv_into(self, sock, buffer) -> int:
+        self.read_wait(sock, self._current)
+        self._current = None
+        await self.switch()
+        return sock.recv_into(buffer)
+
+    async def _wait_writable(self, sock) -> None:
+        self.write_wait(sock, self._current)
+        self._current = None
+        await self.switch()
+
+    async def sendall(self, sock, data) -> None:
+        """Send all of data from a non-blocking socket; short writes only move a memoryview."""
+        view = memoryview(data)
+        while view:
+            try:
+                sent = sock.send(view)
+            except BlockingIOError:
+                await self._wait_writable(sock)
+                continue
+            view = view[sent:]
+
+    async def sendmsg(self, sock, buffers) -> None:
+        """Scatter-gather sendall: the buffers go out in order without being joined."""
+        if not hasattr(sock, 'sendmsg'):
+            for buffer in buffers:
+                await self.sendall(sock, buffer)
+            return
+        views = collections.deque(memoryview(buffer) for buffer in buffers if len(buffer))
+        while views:
+            try:
+                sent = sock.sendmsg(views)
+            except BlockingIOError:
+                await self._wait_writable(sock)
+                continue
+            while sent:
+                if sent < len(views[0]):
+                    views[0] = views[0][sent:]
+                    break
+                sent -= len(views.popleft())
+
     async def accept(self, sock):
         self.read_wait(sock, self._current)
         self._current = None
         await self.switch()
         return sock.accept()
 
+    async def run_in_executor(self, pool: Executor, func: Callable[..., Any], *args) -> Any:
+        if self._wakeup_recv is None:
+            self._wakeup_recv, self._wakeup_send = socketpair()
+            self._wakeup_recv.setblocking(False)
+            self._wakeup_send.setblocking(False)
+        task = self._current
+        future = pool.submit(func, *args)
+        self._executor_pending += 1
+        if self._executor_pending == 1:
+            self.read_wait(self._wakeup_recv, self._executor_wakeup)
+        future.add_done_callback(lambda _: self._executor_job_done(task))
+        self._current = None
+        await self.switch()
+        return future.result()
+
+    def _executor_job_done(self, task: 'Task') -> None:
+        # Runs in the executor's thread: deque.append is thread-safe, the byte wakes the poller.
+        self._executor_done.append(task)
+        try:
+            self._wakeup_send.send(b'\0')
+        except BlockingIOError:
+            pass  # the pipe is full of wakeups already
+
+    def _executor_wakeup(self) -> None:
+        try:
+            while self._wakeup_recv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self._executor_done:
+            self._tasks_ready.append((self._executor_done.popleft(), ()))
+            self._executor_pending -= 1
+        if self._executor_pending:
+            self.read_wait(self._wakeup_recv, self._executor_wakeup)
+
 
 scheduler = Scheduler()
+buffer_pool = BufferPool()
 
 
 class Task:
@@ -138,6 +389,9 @@ class Task:
 
     # Make coroutine look like a callback. Imitating the asyncio.
     def __call__(self):
+        stats = scheduler.get_stats()
+        if stats is not None:
+            send_start = time.perf_counter_ns()
         try:
             # Driving a coroutine
             scheduler.set_current(self)
@@ -147,40 +401,95 @@ class Task:
 
         except (StopIteration,):
             pass
+        finally:
+            if stats is not None:
+                stats.task_time.record((time.perf_counter_ns() - send_start) // 1000)
 
 
 class AsyncQueue:
 
-    def __init__(self, schler: Scheduler = scheduler):
+    def __init__(self, schler: Scheduler = scheduler, maxsize: int = 0):
         self._scheduler = schler
+        self._maxsize = maxsize
         self._items = collections.deque()
-        self._waiting = collections.deque()
+        self._waiting = collections.deque()  # consumers waiting for items
+        self._waiting_putters = collections.deque()  # producers waiting for room
         self._closed = False
 
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def full(self) -> bool:
+        return 0 < self._maxsize <= len(self._items)
+
     def close(self) -> None:
         self._closed = True
-        if self._waiting and not self._items:
-            still_waiting_coro = self._waiting.popleft()
-            self._scheduler.add_to_tasks_ready(still_waiting_coro)
+        self._wake(self._waiting, len(self._waiting))
+        self._wake(self._waiting_putters, len(self._waiting_putters))
+
+    def _wake(self, waiters: collections.deque, count: int) -> None:
+        for _ in range(min(count, len(waiters))):
+            self._scheduler.add_to_tasks_ready(waiters.popleft())
+
+    async def _wait(self, waiters: collections.deque, woken_before: bool) -> None:
+        # A task that was woken but lost the race keeps its place at the front.
+        if woken_before:
+            waiters.appendleft(self._scheduler.get_current())
+        else:
+            waiters.append(self._scheduler.get_current())
+        self._scheduler.set_current(None)
+        await self._scheduler.switch()
 
     async def put(self, item):
+        woken_before = False
+        while self.full() and not self._closed:
+            await self._wait(self._waiting_putters, woken_before)
+            woken_before = True
         if self._closed:
             raise QueueClosed()
 
         self._items.append(item)
-        if self._waiting:
-            first_waiting_task = self._waiting.popleft()
-            self._scheduler.add_to_tasks_ready(first_waiting_task)
+        self._wake(self._waiting, 1)
+
+    async def put_many(self, items):
+        """Put a whole batch, suspending only while the queue has no room at all."""
+        items = list(items)
+        start, woken_before = 0, False
+        while start < len(items):
+            while self.full() and not self._closed:
+                await self._wait(self._waiting_putters, woken_before)
+                woken_before = True
+            if self._closed:
+                raise QueueClosed()
+            stop = len(items)
+            if self._maxsize:
+                stop = min(stop, start + self._maxsize - len(self._items))
+            self._items.extend(items[start:stop])
+            self._wake(self._waiting, stop - start)
+            start = stop
 
     async def get(self):
+        woken_before = False
         while not self._items:
             if self._closed:
                 raise QueueClosed()
-            self._waiting.append(self._scheduler.get_current())
-            self._scheduler.set_current(None)
-            await self._scheduler.switch()
+            await self._wait(self._waiting, woken_before)
+            woken_before = True
+        self._wake(self._waiting_putters, 1)
         return self._items.popleft()
 
+    async def get_many(self, max_items: int) -> list:
+        """Take up to max_items at once, waiting only while the queue is empty."""
+        woken_before = False
+        while not self._items:
+            if self._closed:
+                raise QueueClosed()
+            await self._wait(self._waiting, woken_before)
+            woken_before = True
+        batch = [self._items.popleft() for _ in range(min(max_items, len(self._items)))]
+        self._wake(self._waiting_putters, len(batch))
+        return batch
+
 
 async def producer(q: AsyncQueue, amount: int) -> None:
     for i in range(amount):
@@ -206,10 +515,7 @@ async def consumer(q: AsyncQueue) -> None:
 def count_down(start: int = 0) -> None:
     if start >= 0:
         print(f'Down {start}')
-        scheduler.call_soon(
-            lambda: count_down(start - 1),
-            delayed=SLEEP_TIME * 2,
-        )
+        scheduler.call_later(SLEEP_TIME * 2, count_down, start - 1)
 
 
 def count_up(start: int = 0, stop: int = 0) -> None:
@@ -218,47 +524,68 @@ def count_up(start: int = 0, stop: int = 0) -> None:
         if start <= stop:
             print(f'Up {start}')
             start += 1
-            scheduler.call_soon(
-                lambda: _do(),
-                delayed=SLEEP_TIME
-            )
+            scheduler.call_later(SLEEP_TIME, _do)
 
     _do()
 
 
-if __name__ == '__main__':
-    from socket import socket, AF_INET, SOCK_STREAM
+def listening_socket(addr, backlog: int = 1, reuse_port: bool = False) -> socket:
+    sock = socket(AF_INET, SOCK_STREAM)
+    sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+    sock.bind(addr)
+    sock.listen(backlog)
+    return sock
 
-    q = AsyncQueue()
 
+async def tcp_server(addr, backlog: int = 1):
+    await accept_loop(listening_socket(addr, backlog))
 
-    scheduler.add_task(producer(q, 10))
-    scheduler.add_task(consumer(q))
-
-    scheduler.call_soon(lambda: count_down(start=10))
-    scheduler.call_soon(lambda: count_up(stop=10))
 
-    async def tcp_server(addr):
-        sock = socket(AF_INET, SOCK_STREAM)
-        sock.bind(addr)
-        sock.listen(1)
-        while True:
+async def accept_loop(sock, counters=None):
+    while True:
+        try:
             client, _ = await scheduler.accept(sock)
-            scheduler.add_task(echo_handler(client))
+        except BlockingIOError:
+            # Another process sharing this listening socket took the connection.
+            continue
+        client.setblocking(False)
+        scheduler.add_task(echo_handler(client, counters))
 
 
-    async def echo_handler(client_socket):
+async def echo_handler(client_socket, counters=None):
+    if counters is not None:
+        counters.connection_opened()
+    buffer = buffer_pool.acquire()
+    try:
         while True:
-            data = await scheduler.recv(client_socket, 10000)
-            if not data:
+            size = await scheduler.recv_into(client_socket, buffer)
+            if not size:
                 break
-            await scheduler.send(
+            await scheduler.sendmsg(
                 client_socket,
-                b'Got: ' + data
+                (ECHO_PREFIX, buffer[:size])
             )
+            if counters is not None:
+                counters.message_echoed(size)
+    finally:
+        # A reset connection raises out of recv_into or sendmsg.
+        buffer_pool.release(buffer)
         print('Connection closed')
         client_socket.close()
+        if counters is not None:
+            counters.connection_closed()
+
+
+if __name__ == '__main__':
+    q = AsyncQueue()
+
+    scheduler.add_task(producer(q, 10))
+    scheduler.add_task(consumer(q))
 
+    scheduler.call_soon(count_down, 10)
+    scheduler.call_soon(count_up, 0, 10)
 
     scheduler.add_task(
         tcp_server(('', 30001))
@@ -0,0 +1,112 @@
+"""Large-echo throughput: pooled recv_into/sendmsg against recv + concatenation.
+
+The copying handler is the old echo path with its missing short-write handling
+filled in the naive way: fresh bytes from recv, b'Got: ' + data, and a send loop
+that re-slices (copies) the unsent tail. The pooled one is echo_handler.
+
+The client streams TOTAL bytes in MESSAGE-sized writes over one connection from
+a thread, shuts its side down and reads until the server closes. Server CPU
+time comes from the child's rusage.
+
+    python buffer_benchmark.py [copying|pooled] [total_mb]
+
+512 MB over loopback, single core:
+
+copying | message     1024 B |   501.7 MB/s | server cpu  0.38 s
+ pooled | message     1024 B |   589.7 MB/s | server cpu  0.25 s
+copying | message    65536 B |  1366.9 MB/s | server cpu  0.25 s
+ pooled | message    65536 B |  1238.8 MB/s | server cpu  0.27 s
+copying | message  1048576 B |  1260.5 MB/s | server cpu  0.26 s
+ pooled | message  1048576 B |  1235.4 MB/s | server cpu  0.26 s
+
+With big reads the kernel copies dominate and both paths end up even; the
+pooled one wins where per-message allocations add up.
+"""
+import multiprocessing
+import resource
+import socket
+import sys
+import threading
+import time
+
+import async_with_both_coro_and_callbacks as beazley
+
+ADDRESS = ('127.0.0.1', 30005)
+TOTAL = 512 * 2 ** 20
+MESSAGE_SIZES = (1024, 64 * 1024, 2 ** 20)
+
+
+async def copying_echo_handler(client_socket):
+    while True:
+        data = await beazley.scheduler.recv(client_socket, beazley.BUFFER_SIZE)
+        if not data:
+            break
+        data = beazley.ECHO_PREFIX + data
+        while data:
+            try:
+                sent = client_socket.send(data)
+            except BlockingIOError:
+                await beazley.scheduler._wait_writable(client_socket)
+                continue
+            data = data[sent:]
+    client_socket.close()
+
+
+async def copying_server(addr):
+    sock = beazley.listening_socket(addr)
+    while True:
+        client, _ = await beazley.scheduler.accept(sock)
+        client.setblocking(False)
+        beazley.scheduler.add_task(copying_echo_handler(client))
+
+
+def serve(mode: str) -> None:
+    sys.stdout = open('/dev/null', 'w')
+    if mode == 'copying':
+        beazley.scheduler.add_task(copying_server(ADDRESS))
+    else:
+        beazley.scheduler.add_task(beazley.tcp_server(ADDRESS))
+    beazley.scheduler.run()
+
+
+def stream(conn: socket.socket, total: int, message_size: int) -> None:
+    message = b'x' * message_size
+    for _ in range(total // message_size):
+        conn.sendall(message)
+    conn.shutdown(socket.SHUT_WR)
+
+
+def measure(mode: str, total: int, message_size: int) -> None:
+    cpu_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    server = multiprocessing.Process(target=serve, args=(mode,))
+    server.start()
+    time.sleep(.5)
+
+    conn = socket.create_connection(ADDRESS)
+    start_time = time.perf_counter()
+    sender = threading.Thread(target=stream, args=(conn, total, message_size))
+    sender.start()
+    received = bytearray(beazley.BUFFER_SIZE)
+    while conn.recv_into(received):
+        pass
+    elapsed = time.perf_counter() - start_time
+    sender.join()
+    conn.close()
+    server.terminate()
+    server.join()
+
+    cpu_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    server_cpu = (cpu_after.ru_utime + cpu_after.ru_stime) - (cpu_before.ru_utime + cpu_before.ru_stime)
+    print(
+        f'{mode:>7} | message {message_size:>8} B | {total / elapsed / 2 ** 20:>7.1f} MB/s | '
+        f'server cpu {server_cpu:>5.2f} s'
+    )
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:] + [None] * 2
+    modes = [args[0]] if args[0] else ['copying', 'pooled']
+    total_bytes = int(args[1] or TOTAL // 2 ** 20) * 2 ** 20
+    for size in MESSAGE_SIZES:
+        for name in modes:
+            measure(name, total_bytes, size)
@@ -1,8 +1,9 @@
 import collections
 import time
-import heapq
 from typing import Callable, Any, Union
 
+from timer_wheel import TimerWheel, TimerHandle
+
 SLEEP_TIME = 1
 
 
@@ -10,44 +11,39 @@ class Scheduler:
 
     def __init__(self):
         self._tasks_ready = collections.deque()
-        self._tasks_delayed = []
-        self._sequence = 0
-
-    def run_soon(self, func: Callable[[...], Any], delayed: Union[int, float] = 0) -> None:
-        ready = not bool(delayed)
-        if delayed:
-            self._sequence += 1
-            deadline = time.time() + delayed
-            heapq.heappush(
-                self._tasks_delayed,
-                (deadline, self._sequence, func)
-            )
-        if ready:
-            self._tasks_ready.append(func)
+        self._tasks_delayed = TimerWheel()
+
+    def call_soon(self, func: Callable[..., Any], *args) -> None:
+        self._tasks_ready.append((func, args))
+
+    def call_later(self, delay: Union[int, float], func: Callable[..., Any], *args) -> TimerHandle:
+        if delay <= 0:
+            # The wheel links at least a tick ahead; a due call goes straight to the ready queue.
+            handle = TimerHandle(0, func, args, self._tasks_delayed)
+            self.call_soon(handle)
+            return handle
+        return self._tasks_delayed.call_later(delay, func, *args)
 
     def run(self) -> None:
 
         while self._tasks_ready or self._tasks_delayed:
 
             if not self._tasks_ready:
-                deadline, _, task = heapq.heappop(self._tasks_delayed)
-                time_to_await = deadline - time.time()
+                time_to_await = self._tasks_delayed.next_timeout()
                 if time_to_await > 0:
                     time.sleep(time_to_await)
-                self._tasks_ready.append(task)
+                self._tasks_ready.extend((timer, ()) for timer in self._tasks_delayed.expire())
 
-            while self._tasks_ready:
-                task = self._tasks_ready.popleft()
-                task()
+            ready = self._tasks_ready
+            while ready:
+                func, args = ready.popleft()
+                func(*args)
 
 
 def count_down(scheduler: Scheduler, start: int = 0) -> None:
     if start >= 0:
         print(f'Down {start}')
-        scheduler.run_soon(
-            lambda: count_down(scheduler, start - 1),
-            delayed=SLEEP_TIME * 10,
-        )
+        scheduler.call_later(SLEEP_TIME * 10, count_down, scheduler, start - 1)
 
 
 def count_up(scheduler: Scheduler, start: int = 0, stop: int = 0) -> None:
@@ -56,18 +52,15 @@ def count_up(scheduler: Scheduler, start: int = 0, stop: int = 0) -> None:
         if start <= stop:
             print(f'Up {start}')
             start += 1
-            scheduler.run_soon(
-                lambda: _do(),
-                delayed=SLEEP_TIME
-            )
+            scheduler.call_later(SLEEP_TIME, _do)
 
     _do()
 
 
 if __name__ == '__main__':
     schler = Scheduler()
-    schler.run_soon(lambda: count_down(schler, start=10))
-    schler.run_soon(lambda: count_up(schler, stop=10))
+    schler.call_soon(count_down, schler, 10)
+    schler.call_soon(count_up, schler, 0, 10)
 
     try:
         schler.run()
@@ -27,6 +27,10 @@ class Scheduler:
         return Awaitable()
 
     async def sleep(self, delay: Union[int, float]) -> None:
+        if delay <= 0:
+            # Just yield: the coroutine stays current and goes back on the ready queue.
+            await self.switch()
+            return
         deadline = time.time() + delay
         heapq.heappush(
             self._sleeping,
@@ -64,36 +68,88 @@ class QueueClosed(Exception):
 
 class AsyncQueue:
 
-    def __init__(self, schler: Scheduler):
+    def __init__(self, schler: Scheduler, maxsize: int = 0):
         self._scheduler = schler
+        self._maxsize = maxsize
         self._items = collections.deque()
-        self._waiting = collections.deque()
+        self._waiting = collections.deque()  # consumers waiting for items
+        self._waiting_putters = collections.deque()  # producers waiting for room
         self._closed = False
 
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def full(self) -> bool:
+        return 0 < self._maxsize <= len(self._items)
+
     def close(self) -> None:
         self._closed = True
-        if self._waiting and not self._items:
-            still_waiting_coro = self._waiting.popleft()
-            self._scheduler.add_task(still_waiting_coro)
+        self._wake(self._waiting, len(self._waiting))
+        self._wake(self._waiting_putters, len(self._waiting_putters))
+
+    def _wake(self, waiters: collections.deque, count: int) -> None:
+        for _ in range(min(count, len(waiters))):
+            self._scheduler.add_task(waiters.popleft())
+
+    async def _wait(self, waiters: collections.deque, woken_before: bool) -> None:
+        # A coroutine that was woken but lost the race keeps its place at the front.
+        if woken_before:
+            waiters.appendleft(self._scheduler.get_current_task())
+        else:
+            waiters.append(self._scheduler.get_current_task())
+        self._scheduler.set_no_current()
+        await self._scheduler.switch()
 
     async def put(self, item):
+        woken_before = False
+        while self.full() and not self._closed:
+            await self._wait(self._waiting_putters, woken_before)
+            woken_before = True
         if self._closed:
             raise QueueClosed()
 
         self._items.append(item)
-        if self._waiting:
-            first_waiting_task = self._waiting.popleft()
-            self._scheduler.add_task(first_waiting_task)
+        self._wake(self._waiting, 1)
+
+    async def put_many(self, items):
+        """Put a whole batch, suspending only while the queue has no room at all."""
+        items = list(items)
+        start, woken_before = 0, False
+        while start < len(items):
+            while self.full() and not self._closed:
+                await self._wait(self._waiting_putters, woken_before)
+                woken_before = True
+            if self._closed:
+                raise QueueClosed()
+            stop = len(items)
+            if self._maxsize:
+                stop = min(stop, start + self._maxsize - len(self._items))
+            self._items.extend(items[start:stop])
+            self._wake(self._waiting, stop - start)
+            start = stop
 
     async def get(self):
+        woken_before = False
         while not self._items:
             if self._closed:
                 raise QueueClosed()
-            self._waiting.append(self._scheduler.get_current_task())
-            self._scheduler.set_no_current()
-            await self._scheduler.switch()
+            await self._wait(self._waiting, woken_before)
+            woken_before = True
+        self._wake(self._waiting_putters, 1)
         return self._items.popleft()
 
+    async def get_many(self, max_items: int) -> list:
+        """Take up to max_items at once, waiting only while the queue is empty."""
+        woken_before = False
+        while not self._items:
+            if self._closed:
+                raise QueueClosed()
+            await self._wait(self._waiting, woken_before)
+            woken_before = True
+        batch = [self._items.popleft() for _ in range(min(max_items, len(self._items)))]
+        self._wake(self._waiting_putters, len(batch))
+        return batch
+
 
 async def producer(sched: Scheduler, q: AsyncQueue, amount: int) -> None:
     for i in range(amount):
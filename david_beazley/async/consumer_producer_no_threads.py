@@ -1,8 +1,9 @@
 import collections
 import time
-import heapq
 from typing import Callable, Any, Union
 
+from timer_wheel import TimerWheel, TimerHandle
+
 SLEEP_TIME = 1
 
 
@@ -10,35 +11,33 @@ class Scheduler:
 
     def __init__(self):
         self._tasks_ready = collections.deque()
-        self._tasks_delayed = []
-        self._sequence = 0
-
-    def call_soon(self, func: Callable[[...], Any], delayed: Union[int, float] = 0) -> None:
-        ready = not bool(delayed)
-        if delayed:
-            self._sequence += 1
-            deadline = time.time() + delayed
-            heapq.heappush(
-                self._tasks_delayed,
-                (deadline, self._sequence, func)
-            )
-        if ready:
-            self._tasks_ready.append(func)
+        self._tasks_delayed = TimerWheel()
+
+    def call_soon(self, func: Callable[..., Any], *args) -> None:
+        self._tasks_ready.append((func, args))
+
+    def call_later(self, delay: Union[int, float], func: Callable[..., Any], *args) -> TimerHandle:
+        if delay <= 0:
+            # The wheel links at least a tick ahead; a due call goes straight to the ready queue.
+            handle = TimerHandle(0, func, args, self._tasks_delayed)
+            self.call_soon(handle)
+            return handle
+        return self._tasks_delayed.call_later(delay, func, *args)
 
     def run(self) -> None:
 
         while self._tasks_ready or self._tasks_delayed:
 
             if not self._tasks_ready:
-                deadline, _, task = heapq.heappop(self._tasks_delayed)
-                time_to_await = deadline - time.time()
+                time_to_await = self._tasks_delayed.next_timeout()
                 if time_to_await > 0:
                     time.sleep(time_to_await)
-                self._tasks_ready.append(task)
+                self._tasks_ready.extend((timer, ()) for timer in self._tasks_delayed.expire())
 
-            while self._tasks_ready:
-                task = self._tasks_ready.popleft()
-                task()
+            ready = self._tasks_ready
+            while ready:
+                func, args = ready.popleft()
+                func(*args)
 
 
 class QueueClosed(Exception):
@@ -46,47 +45,61 @@ class QueueClosed(Exception):
 
 
 class Result:
+    __slots__ = ('_value', '_exc')
+
     def __init__(self, value: Any = None, exc: Exception = None):
         self._value = value
         self._exc = exc
 
+    @classmethod
+    def ok(cls, value: Any) -> 'Result':
+        """Shared Result for plain values. Only valid until the callback returns."""
+        result = _OK_RESULT
+        result._value = value
+        return result
+
     def get_result(self):
         if self._exc:
             raise self._exc
         return self._value
 
 
+_OK_RESULT = Result()
+
+
 class AsyncQueue:
 
     def __init__(self, schler: Scheduler):
         self._scheduler = schler
         self._items = collections.deque()
-        self._waiting = collections.deque()
+        self._waiting = collections.deque()  # callbacks of pending gets
         self._closed = False
+        self._get = self.get  # one bound method instead of one per wakeup
 
     def close(self):
         self._closed = True
         if self._waiting and not self._items:
-            for func in self._waiting:
-                self._scheduler.call_soon(func)
+            for callback in self._waiting:
+                self._scheduler.call_soon(self._get, callback)
 
     def put(self, item) -> None:
         if self._closed:
             raise QueueClosed()
         self._items.append(item)
         if self._waiting:
-            func = self._waiting.popleft()
-            self._scheduler.call_soon(func)
+            callback = self._waiting.popleft()
+            self._scheduler.call_soon(self._get, callback)
 
     def get(self, callback: Callable[[...], Any]) -> None:
-        if self._closed:
-            callback(Result(exc=QueueClosed()))
-            return
+        # Items put before close() are still handed out.
         if self._items:
             item = self._items.popleft()
-            callback(Result(value=item))
+            callback(Result.ok(item))
+            return
+        if self._closed:
+            callback(Result(exc=QueueClosed()))
             return
-        self._waiting.append(lambda: self.get(callback))
+        self._waiting.append(callback)
 
 
 def producer_call_back_based(schler: Scheduler, aqu: AsyncQueue, amount: int) -> None:
@@ -94,10 +107,7 @@ def producer_call_back_based(schler: Scheduler, aqu: AsyncQueue, amount: int) ->
         if n <= amount:
             print(f'Produced {n}')
             aqu.put(n)
-            schler.call_soon(
-                lambda: _produce(n + 1),
-                SLEEP_TIME
-            )
+            schler.call_later(SLEEP_TIME, _produce, n + 1)
             return
         print(f'Producer done. Now that we have a close method, '
               f'we do not need a none sentinel anymore.')
@@ -111,7 +121,7 @@ def consumer_call_back_based(schler: Scheduler, aqu: AsyncQueue) -> None:
         try:
             item = result_from_producer.get_result()
             print(f'Consumed {item}')
-            schler.call_soon(lambda: consumer_call_back_based(schler, aqu))
+            schler.call_soon(consumer_call_back_based, schler, aqu)
         except QueueClosed:
             print(f'Queue appeared to be closed. Consumer done.')
 
@@ -121,10 +131,6 @@ def consumer_call_back_based(schler: Scheduler, aqu: AsyncQueue) -> None:
 if __name__ == '__main__':
     scheduler = Scheduler()
     q = AsyncQueue(scheduler)
-    scheduler.call_soon(
-        lambda: producer_call_back_based(scheduler, q, 10)
-    )
-    scheduler.call_soon(
-        lambda: consumer_call_back_based(scheduler, q)
-    )
+    scheduler.call_soon(producer_call_back_based, scheduler, q, 10)
+    scheduler.call_soon(consumer_call_back_based, scheduler, q)
     scheduler.run()
@@ -0,0 +1,107 @@
+"""Echo latency while the server also runs CPU-bound jobs.
+
+The server process runs tcp_server plus JOBS_IN_FLIGHT coroutines that keep
+computing cpu_job, either inline (blocking the scheduler), or through
+Scheduler.run_in_executor on a thread or a process pool. The client ping-pongs
+over a few connections and reports latency percentiles.
+
+    python executor_benchmark.py [none|inline|thread|process] [rounds]
+
+On a single core, 2 jobs in flight:
+
+   none | p50   0.033 ms | p99   0.100 ms | max   5.232 ms
+ inline | p50  58.667 ms | p99  80.113 ms | max 153.047 ms
+ thread | p50   0.039 ms | p99  18.169 ms | max  37.026 ms
+process | p50   0.030 ms | p99   3.163 ms | max   7.899 ms
+
+A thread pool keeps the loop running, but a pure-Python job holds the GIL for
+whole switch intervals, hence its p99; CPU-bound work belongs in processes.
+"""
+import multiprocessing
+import signal
+import socket
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import async_with_both_coro_and_callbacks as beazley
+
+ADDRESS = ('127.0.0.1', 30004)
+CONNECTIONS = 10
+ROUNDS = 200
+JOBS_IN_FLIGHT = 2
+JOB_SIZE = 300_000
+MESSAGE = b'x' * 64
+
+
+def cpu_job(size: int) -> int:
+    return sum(i * i for i in range(size))
+
+
+async def keep_busy(mode: str, pool) -> None:
+    while True:
+        if mode == 'inline':
+            cpu_job(JOB_SIZE)
+            await beazley.scheduler.sleep(.001)
+        else:
+            await beazley.scheduler.run_in_executor(pool, cpu_job, JOB_SIZE)
+
+
+def serve(mode: str) -> None:
+    sys.stdout = open('/dev/null', 'w')
+    pool = None
+    if mode == 'thread':
+        pool = ThreadPoolExecutor(JOBS_IN_FLIGHT)
+    elif mode == 'process':
+        pool = ProcessPoolExecutor(JOBS_IN_FLIGHT)
+    if mode != 'none':
+        for _ in range(JOBS_IN_FLIGHT):
+            beazley.scheduler.add_task(keep_busy(mode, pool))
+    beazley.scheduler.add_task(beazley.tcp_server(ADDRESS, backlog=CONNECTIONS))
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit())
+    try:
+        beazley.scheduler.run()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def measure(mode: str, rounds: int) -> None:
+    server = multiprocessing.Process(target=serve, args=(mode,))
+    server.start()
+    time.sleep(.5)
+    connections = [socket.create_connection(ADDRESS) for _ in range(CONNECTIONS)]
+    expected = len(b'Got: ' + MESSAGE)
+    latencies = []
+    try:
+        for _ in range(rounds):
+            for conn in connections:
+                start_time = time.perf_counter_ns()
+                conn.sendall(MESSAGE)
+                received = 0
+                while received < expected:
+                    chunk = conn.recv(expected - received)
+                    if not chunk:
+                        raise ConnectionError('server closed the connection')
+                    received += len(chunk)
+                latencies.append(time.perf_counter_ns() - start_time)
+    finally:
+        for conn in connections:
+            conn.close()
+        server.terminate()
+        server.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * .99) - 1]
+    print(
+        f'{mode:>7} | p50 {statistics.median(latencies) / 10 ** 6:>7.3f} ms | '
+        f'p99 {p99 / 10 ** 6:>7.3f} ms | max {latencies[-1] / 10 ** 6:>7.3f} ms'
+    )
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:] + [None] * 2
+    modes = [args[0]] if args[0] else ['none', 'inline', 'thread', 'process']
+    for name in modes:
+        measure(name, int(args[1] or ROUNDS))
@@ -0,0 +1,117 @@
+"""Echo latency of tcp_server/echo_handler with many idle connections around.
+
+The server runs the module-level scheduler of async_with_both_coro_and_callbacks
+in a child process. The client opens IDLE connections that never send anything,
+then ping-pongs ROUNDS messages over each of ACTIVE connections.
+
+    python poller_benchmark.py [select|selectors] [idle] [active] [rounds]
+
+select.select cannot watch descriptors above FD_SETSIZE (1024), so the select
+backend is expected to fail once idle connections push the server past that.
+
+   select | idle    500 | active   50 |     2602 msg/s | p50   333.1 us | p99   821.4 us
+selectors | idle    500 | active   50 |    31539 msg/s | p50    31.9 us | p99    57.9 us
+   select | idle  10000 | failed: ValueError: filedescriptor out of range in select()
+selectors | idle  10000 | active  100 |    35672 msg/s | p50    22.2 us | p99    46.1 us
+"""
+import multiprocessing
+import resource
+import socket
+import statistics
+import sys
+import time
+from typing import List
+
+import async_with_both_coro_and_callbacks as beazley
+
+ADDRESS = ('127.0.0.1', 30002)
+BACKLOG = 1024
+IDLE = 10_000
+ACTIVE = 100
+ROUNDS = 50
+MESSAGE = b'x' * 64
+
+POLLERS = {
+    'select': beazley.SelectPoller,
+    'selectors': beazley.SelectorsPoller,
+}
+
+
+def raise_fd_limit() -> None:
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def serve(poller_name: str) -> None:
+    raise_fd_limit()
+    sys.stdout = open('/dev/null', 'w')
+    beazley.scheduler.set_poller(POLLERS[poller_name]())
+    beazley.scheduler.add_task(beazley.tcp_server(ADDRESS, backlog=BACKLOG))
+    beazley.scheduler.run()
+
+
+def connect(count: int) -> List[socket.socket]:
+    connections = []
+    for _ in range(count):
+        connections.append(socket.create_connection(ADDRESS))
+    return connections
+
+
+def ping_pong(connections: List[socket.socket], rounds: int) -> List[int]:
+    expected = len(b'Got: ' + MESSAGE)
+    latencies = []
+    for _ in range(rounds):
+        for conn in connections:
+            start_time = time.perf_counter_ns()
+            conn.sendall(MESSAGE)
+            received = 0
+            while received < expected:
+                chunk = conn.recv(expected - received)
+                if not chunk:
+                    raise ConnectionError('server closed the connection')
+                received += len(chunk)
+            latencies.append(time.perf_counter_ns() - start_time)
+    return latencies
+
+
+def run_benchmark(poller_name: str, idle: int, active: int, rounds: int) -> None:
+    raise_fd_limit()
+    server = multiprocessing.Process(target=serve, args=(poller_name,), daemon=True)
+    server.start()
+    time.sleep(.5)
+
+    idle_connections, active_connections = [], []
+    try:
+        idle_connections = connect(idle)
+        active_connections = connect(active)
+        start_time = time.perf_counter()
+        latencies = ping_pong(active_connections, rounds)
+        elapsed = time.perf_counter() - start_time
+    except OSError as e:
+        print(f'{poller_name:>9} | idle {idle:>6} | failed: {e!r}')
+        return
+    finally:
+        for conn in idle_connections + active_connections:
+            conn.close()
+        server.terminate()
+        server.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * .99) - 1]
+    print(
+        f'{poller_name:>9} | idle {idle:>6} | active {active:>4} | '
+        f'{len(latencies) / elapsed:>8.0f} msg/s | '
+        f'p50 {statistics.median(latencies) / 1000:>7.1f} us | p99 {p99 / 1000:>7.1f} us'
+    )
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:] + [None] * 4
+    names = [args[0]] if args[0] else list(POLLERS)
+    for name in names:
+        run_benchmark(
+            name,
+            idle=int(args[1] or IDLE),
+            active=int(args[2] or ACTIVE),
+            rounds=int(args[3] or ROUNDS),
+        )
@@ -0,0 +1,262 @@
+"""One workload through every producer/consumer model of this directory.
+
+    threads     threading + queue.Queue, as in consumer_producer_problem
+    callbacks   Scheduler/AsyncQueue of consumer_producer_no_threads
+    coroutines  Scheduler/AsyncQueue of consumer_producer_no_callbacks
+    mixed       scheduler/AsyncQueue of async_with_both_coro_and_callbacks
+    asyncio     asyncio.Queue, for reference
+
+The demo producers and consumers print and sleep, so each model gets a driver
+here built from its own scheduler and queue: producers put perf_counter_ns()
+stamps with no sleep, consumers record how long each stamp waited. Queues are
+bounded by MAXSIZE where the model supports it. Every model runs in a fresh
+process, so peak RSS and context switches (voluntary + involuntary, rusage)
+belong to it alone.
+
+    python producer_consumer_benchmark.py [items] [producers] [consumers] [results.json] [baseline.json]
+
+Results are written as JSON, by default to RESULTS_PATH in the repository's
+auxiliary directory; with a baseline the change of every rate is shown. A
+model whose process dies is reported and left out, and the run exits with 1.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import threading
+import time
+from array import array
+from typing import Dict, List, Tuple
+
+import async_with_both_coro_and_callbacks as mixed_model
+import consumer_producer_no_callbacks as coroutine_model
+import consumer_producer_no_threads as callback_model
+
+ITEMS = 200_000
+PRODUCERS = 1
+CONSUMERS = 4
+MAXSIZE = 1000
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'auxiliary',
+                            'producer_consumer_results.json')
+
+
+def split(amount: int, parts: int) -> List[int]:
+    return [amount // parts + (i < amount % parts) for i in range(parts)]
+
+
+def run_threads(amount: int, producers: int, consumers: int, latencies: array) -> None:
+    q = queue.Queue(maxsize=MAXSIZE)
+
+    def produce(count: int) -> None:
+        for _ in range(count):
+            q.put(time.perf_counter_ns())
+
+    def consume() -> None:
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            latencies.append(time.perf_counter_ns() - item)
+
+    producer_threads = [threading.Thread(target=produce, args=(n,)) for n in split(amount, producers)]
+    consumer_threads = [threading.Thread(target=consume) for _ in range(consumers)]
+    for thread in producer_threads + consumer_threads:
+        thread.start()
+    for thread in producer_threads:
+        thread.join()
+    for _ in consumer_threads:
+        q.put(None)
+    for thread in consumer_threads:
+        thread.join()
+
+
+def run_callbacks(amount: int, producers: int, consumers: int, latencies: array) -> None:
+    sched = callback_model.Scheduler()
+    q = callback_model.AsyncQueue(sched)
+    running = [producers]
+
+    def produce(left: int) -> None:
+        if left:
+            q.put(time.perf_counter_ns())
+            sched.call_soon(produce, left - 1)
+            return
+        running[0] -= 1
+        if not running[0]:
+            q.close()
+
+    def consume(result: callback_model.Result) -> None:
+        try:
+            item = result.get_result()
+        except callback_model.QueueClosed:
+            return
+        latencies.append(time.perf_counter_ns() - item)
+        sched.call_soon(q.get, consume)
+
+    for count in split(amount, producers):
+        sched.call_soon(produce, count)
+    for _ in range(consumers):
+        sched.call_soon(q.get, consume)
+    sched.run()
+
+
+async def produce_into(q, count: int, running: List[int]) -> None:
+    for _ in range(count):
+        await q.put(time.perf_counter_ns())
+    running[0] -= 1
+    if not running[0]:
+        q.close()
+
+
+async def consume_from(q, closed_exception, latencies: array) -> None:
+    try:
+        while True:
+            item = await q.get()
+            latencies.append(time.perf_counter_ns() - item)
+    except closed_exception:
+        pass
+
+
+def run_coroutines(amount: int, producers: int, consumers: int, latencies: array) -> None:
+    sched = coroutine_model.Scheduler()
+    q = coroutine_model.AsyncQueue(sched, maxsize=MAXSIZE)
+    running = [producers]
+    for count in split(amount, producers):
+        sched.add_task(produce_into(q, count, running))
+    for _ in range(consumers):
+        sched.add_task(consume_from(q, coroutine_model.QueueClosed, latencies))
+    sched.run()
+
+
+def run_mixed(amount: int, producers: int, consumers: int, latencies: array) -> None:
+    q = mixed_model.AsyncQueue(maxsize=MAXSIZE)
+    running = [producers]
+    for count in split(amount, producers):
+        mixed_model.scheduler.add_task(produce_into(q, count, running))
+    for _ in range(consumers):
+        mixed_model.scheduler.add_task(consume_from(q, mixed_model.QueueClosed, latencies))
+    mixed_model.scheduler.run()
+
+
+def run_asyncio(amount: int, producers: int, consumers: int, latencies: array) -> None:
+    async def produce(q: asyncio.Queue, count: int) -> None:
+        for _ in range(count):
+            await q.put(time.perf_counter_ns())
+
+    async def consume(q: asyncio.Queue) -> None:
+        while True:
+            item = await q.get()
+            if item is None:
+                break
+            latencies.append(time.perf_counter_ns() - item)
+
+    async def main() -> None:
+        q = asyncio.Queue(maxsize=MAXSIZE)
+        consumer_tasks = [asyncio.create_task(consume(q)) for _ in range(consumers)]
+        await asyncio.gather(*(produce(q, count) for count in split(amount, producers)))
+        for _ in consumer_tasks:
+            await q.put(None)
+        await asyncio.gather(*consumer_tasks)
+
+    asyncio.run(main())
+
+
+MODELS = {
+    'threads': run_threads,
+    'callbacks': run_callbacks,
+    'coroutines': run_coroutines,
+    'mixed': run_mixed,
+    'asyncio': run_asyncio,
+}
+
+
+def percentile(ordered: List[int], share: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))] / 1000
+
+
+def measure(model: str, amount: int, producers: int, consumers: int, results) -> None:
+    latencies = array('q')
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start_time = time.perf_counter()
+    MODELS[model](amount, producers, consumers, latencies)
+    elapsed = time.perf_counter() - start_time
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    assert len(latencies) == amount, (model, len(latencies))
+    switches = (usage_after.ru_nvcsw + usage_after.ru_nivcsw) - (usage_before.ru_nvcsw + usage_before.ru_nivcsw)
+    ordered = sorted(latencies)
+    results.put({
+        'model': model,
+        'items': amount,
+        'producers': producers,
+        'consumers': consumers,
+        'items_per_sec': amount / elapsed,
+        'context_switches_per_sec': switches / elapsed,
+        'latency_us': {
+            'p50': percentile(ordered, .5),
+            'p90': percentile(ordered, .9),
+            'p99': percentile(ordered, .99),
+            'max': ordered[-1] / 1000,
+        },
+        'peak_rss_kb': usage_after.ru_maxrss,
+    })
+
+
+def run_all(amount: int, producers: int, consumers: int) -> Tuple[List[Dict], List[str]]:
+    """Rows of the models that reported, and the names of those whose process died."""
+    results = multiprocessing.Queue()
+    rows = []
+    failed = []
+    for model in MODELS:
+        process = multiprocessing.Process(target=measure, args=(model, amount, producers, consumers, results))
+        process.start()
+        while True:
+            try:
+                rows.append(results.get(timeout=1))
+                break
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+            # A row put right before exiting may still be on its way through the pipe.
+            try:
+                rows.append(results.get(timeout=1))
+            except queue.Empty:
+                failed.append(model)
+                print(f'{model} failed: its process exited with {process.exitcode}', file=sys.stderr)
+            break
+        process.join()
+    return rows, failed
+
+
+def print_rows(rows: List[Dict], baseline: Dict[str, Dict]) -> None:
+    for row in rows:
+        line = (
+            f'{row["model"]:>10} | {row["items_per_sec"]:>9.0f} items/s | '
+            f'{row["context_switches_per_sec"]:>8.0f} ctx/s | '
+            f'p50 {row["latency_us"]["p50"]:>9.1f} us | p99 {row["latency_us"]["p99"]:>9.1f} us | '
+            f'rss {row["peak_rss_kb"] / 1024:>6.1f} MB'
+        )
+        old = baseline.get(row['model'])
+        if old:
+            line += f' | {row["items_per_sec"] / old["items_per_sec"] - 1:>+6.1%} vs baseline'
+        print(line)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:] + [None] * 5
+    measured, failed_models = run_all(
+        amount=int(args[0] or ITEMS),
+        producers=int(args[1] or PRODUCERS),
+        consumers=int(args[2] or CONSUMERS),
+    )
+    baseline_rows = {}
+    if args[4]:
+        with open(args[4]) as f:
+            baseline_rows = {row['model']: row for row in json.load(f)}
+    print_rows(measured, baseline_rows)
+    with open(args[3] or RESULTS_PATH, mode='w') as f:
+        json.dump(measured, f, indent=2)
+    if failed_models:
+        sys.exit(1)
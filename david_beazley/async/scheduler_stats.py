@@ -0,0 +1,108 @@
+"""Opt-in health statistics for the Scheduler of async_with_both_coro_and_callbacks.
+
+Every measurement goes into a Histogram with fixed power-of-two buckets, so
+recording is a bisect and two additions no matter how long the scheduler runs.
+Times are in microseconds:
+
+    loop_lag      how late each timer fired, from its deadline to the poll
+                  that found it expired
+    batch_time    time one batch of ready callbacks ran between two polls,
+                  i.e. how long a newly ready socket may wait to be noticed
+    task_time     time one Task.__call__ spent in coro.send
+    poll_time     time spent blocked in the poller
+    ready_depth   tasks in the ready queue when a batch starts
+    delayed_size  timers in the timer wheel at each poll
+
+    scheduler.enable_stats()
+    scheduler.add_task(stats_server(scheduler, '/tmp/scheduler.sock'))
+
+and `nc -U /tmp/scheduler.sock` prints the JSON dump.
+"""
+import bisect
+import json
+import os
+import socket
+from typing import Dict, List, Optional
+
+TIME_BOUNDS = [2 ** i for i in range(25)]  # 1 us .. ~16.8 s
+SIZE_BOUNDS = [0] + [2 ** i for i in range(21)]  # 0 .. ~1M
+
+
+class Histogram:
+
+    def __init__(self, bounds: List[int]):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)  # the last bucket takes everything above
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value) -> None:
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, share: float) -> Optional[float]:
+        """Upper bound of the bucket holding the given share of the values."""
+        if not self.count:
+            return None
+        rank = share * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self._counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self._bounds[index] if index < len(self._bounds) else self.max
+        return self.max
+
+    def as_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.percentile(.5),
+            'p99': self.percentile(.99),
+            'buckets': {
+                f'<={bound}': bucket_count
+                for bound, bucket_count in zip(self._bounds, self._counts) if bucket_count
+            },
+            'overflow': self._counts[-1],
+        }
+
+
+class SchedulerStats:
+
+    def __init__(self):
+        self.loop_lag = Histogram(TIME_BOUNDS)
+        self.batch_time = Histogram(TIME_BOUNDS)
+        self.task_time = Histogram(TIME_BOUNDS)
+        self.poll_time = Histogram(TIME_BOUNDS)
+        self.ready_depth = Histogram(SIZE_BOUNDS)
+        self.delayed_size = Histogram(SIZE_BOUNDS)
+
+    def as_dict(self) -> Dict:
+        return {name: histogram.as_dict() for name, histogram in vars(self).items()}
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict(), indent=2)
+
+    def dump(self, path: str) -> None:
+        with open(path, mode='w') as f:
+            f.write(self.to_json())
+
+
+async def stats_server(sched, path: str) -> None:
+    """Answer every connection on a unix socket with the current JSON dump."""
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(8)
+    while True:
+        client, _ = await sched.accept(sock)
+        client.setblocking(False)
+        stats = sched.get_stats()
+        payload = stats.to_json() if stats is not None else '{}'
+        await sched.sendall(client, payload.encode() + b'\n')
+        client.close()
@@ -0,0 +1,231 @@
+"""Echo server sharded over N worker processes, one Scheduler per worker.
+
+Every worker binds its own listening socket to the same port with SO_REUSEPORT,
+so the kernel spreads incoming connections between them. Where SO_REUSEPORT is
+missing the parent binds a single socket before forking and all workers accept
+from it.
+
+The parent supervises the workers: a worker that dies is started again, and
+SIGTERM/SIGINT make every worker stop accepting and drain its open connections
+for up to DRAIN_TIMEOUT seconds. Per-worker counters live in shared memory and
+are printed every REPORT_INTERVAL seconds and on exit.
+
+    python sharded_echo_server.py [workers] [port]
+    python sharded_echo_server.py bench [max_workers] [clients] [seconds]
+"""
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from multiprocessing.connection import wait
+from typing import List, Optional
+
+import async_with_both_coro_and_callbacks as beazley
+
+HOST = '0.0.0.0'
+PORT = 30003
+BACKLOG = 1024
+DRAIN_TIMEOUT = 10
+DRAIN_CHECK_INTERVAL = .1
+REPORT_INTERVAL = 5
+RESTART_DELAY = .5
+
+COUNTER_FIELDS = ('accepted', 'open', 'messages', 'bytes', 'restarts')
+
+mp = multiprocessing.get_context('fork')
+
+
+class WorkerCounters:
+    """A worker's row in the shared counters array. Only its own worker writes it."""
+
+    def __init__(self, shared, worker_id: int):
+        self._shared = shared
+        self._offset = worker_id * len(COUNTER_FIELDS)
+
+    def __getitem__(self, field: str) -> int:
+        return self._shared[self._offset + COUNTER_FIELDS.index(field)]
+
+    def _add(self, field: str, amount: int = 1) -> None:
+        self._shared[self._offset + COUNTER_FIELDS.index(field)] += amount
+
+    def connection_opened(self) -> None:
+        self._add('accepted')
+        self._add('open')
+
+    def connection_closed(self) -> None:
+        self._add('open', -1)
+
+    def message_echoed(self, size: int) -> None:
+        self._add('messages')
+        self._add('bytes', size)
+
+    def worker_restarted(self) -> None:
+        self._add('restarts')
+        self._shared[self._offset + COUNTER_FIELDS.index('open')] = 0
+
+    def as_dict(self) -> dict:
+        return {field: self[field] for field in COUNTER_FIELDS}
+
+
+def reuse_port_supported() -> bool:
+    if beazley.SO_REUSEPORT is None:
+        return False
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        probe.setsockopt(socket.SOL_SOCKET, beazley.SO_REUSEPORT, 1)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def run_worker(addr, counters: WorkerCounters, shared_sock: Optional[socket.socket]) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sys.stdout = open(os.devnull, 'w')
+
+    sched = beazley.scheduler
+    # An epoll instance created before the fork would be shared by every worker.
+    sched.set_poller(beazley.default_poller())
+    sock = shared_sock or beazley.listening_socket(addr, BACKLOG, reuse_port=True)
+    sock.setblocking(False)
+
+    # Self-pipe: the signal only writes a byte, the scheduler wakes up on it.
+    wakeup_recv, wakeup_send = socket.socketpair()
+    wakeup_send.setblocking(False)
+    signal.set_wakeup_fd(wakeup_send.fileno())
+    signal.signal(signal.SIGTERM, lambda *_: None)
+
+    async def drain_on_signal():
+        await sched.recv(wakeup_recv, 1)
+        sched.cancel_wait(sock)
+        sock.close()
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+
+        def _check_drained() -> None:
+            if counters['open'] <= 0 or time.monotonic() >= deadline:
+                raise SystemExit(0)
+            sched.call_later(DRAIN_CHECK_INTERVAL, _check_drained)
+
+        _check_drained()
+
+    sched.add_task(beazley.accept_loop(sock, counters))
+    sched.add_task(drain_on_signal())
+    sched.run()
+
+
+class Supervisor:
+
+    def __init__(self, addr, workers: int):
+        self._addr = addr
+        self._workers_count = workers
+        self._shared = mp.Array('q', workers * len(COUNTER_FIELDS), lock=False)
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._shared_sock = None
+        if not reuse_port_supported():
+            self._shared_sock = beazley.listening_socket(addr, BACKLOG)
+        self._stopping = False
+
+    def counters(self, worker_id: int) -> WorkerCounters:
+        return WorkerCounters(self._shared, worker_id)
+
+    def _start(self, worker_id: int) -> None:
+        process = mp.Process(
+            target=run_worker,
+            args=(self._addr, self.counters(worker_id), self._shared_sock),
+            name=f'echo-worker-{worker_id}',
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+    def _stop(self, *_) -> None:
+        self._stopping = True
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+
+    def report(self) -> None:
+        for worker_id, process in enumerate(self._processes):
+            print(f'worker {worker_id} pid {process.pid}: {self.counters(worker_id).as_dict()}')
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for worker_id in range(self._workers_count):
+            self._start(worker_id)
+
+        next_report = time.monotonic() + REPORT_INTERVAL
+        while any(process.is_alive() for process in self._processes):
+            wait([process.sentinel for process in self._processes], timeout=REPORT_INTERVAL)
+            for worker_id, process in enumerate(self._processes):
+                if process.is_alive() or self._stopping:
+                    continue
+                print(f'worker {worker_id} exited with {process.exitcode}, restarting')
+                self.counters(worker_id).worker_restarted()
+                time.sleep(RESTART_DELAY)
+                self._start(worker_id)
+            if time.monotonic() >= next_report:
+                self.report()
+                next_report = time.monotonic() + REPORT_INTERVAL
+        self.report()
+
+
+def echo_client(addr, seconds: float, totals, index: int) -> None:
+    conn = socket.create_connection(addr)
+    message = b'x' * 64
+    expected = len(b'Got: ' + message)
+    done = 0
+    deadline = time.monotonic() + seconds
+    try:
+        while time.monotonic() < deadline:
+            conn.sendall(message)
+            received = 0
+            while received < expected:
+                chunk = conn.recv(expected - received)
+                if not chunk:
+                    # The worker holding the connection died and is being restarted.
+                    raise ConnectionError('server closed the connection')
+                received += len(chunk)
+            done += 1
+    finally:
+        conn.close()
+        totals[index] = done
+
+
+def bench(max_workers: int, clients: int, seconds: float) -> None:
+    addr = ('127.0.0.1', PORT)
+    for workers in range(1, max_workers + 1):
+        supervisor = Supervisor(addr, workers)
+        server = mp.Process(target=supervisor.run)
+        server.start()
+        time.sleep(.5)
+        totals = mp.Array('q', clients, lock=False)
+        client_processes = [
+            mp.Process(target=echo_client, args=(addr, seconds, totals, i))
+            for i in range(clients)
+        ]
+        for process in client_processes:
+            process.start()
+        for process in client_processes:
+            process.join()
+        os.kill(server.pid, signal.SIGTERM)
+        server.join()
+        print(f'workers {workers:>2} | clients {clients:>3} | {sum(totals) / seconds:>9.0f} msg/s')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        args = sys.argv[2:] + [None] * 3
+        bench(
+            max_workers=int(args[0] or os.cpu_count()),
+            clients=int(args[1] or 4 * os.cpu_count()),
+            seconds=float(args[2] or 5),
+        )
+    else:
+        args = sys.argv[1:] + [None] * 2
+        Supervisor(
+            (HOST, int(args[1] or PORT)),
+            workers=int(args[0] or os.cpu_count()),
+        ).run()
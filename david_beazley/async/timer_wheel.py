@@ -0,0 +1,242 @@
+"""Hierarchical timing wheel for the schedulers' delayed calls.
+
+Time is cut into ticks of `resolution` seconds (monotonic clock). Level 0 has a
+slot per tick for the next 256 ticks, level 1 a slot per 256 ticks, and so on;
+a timer sits in the coarsest slot that still tells its deadline apart and is
+moved (cascaded) one level down each time the wheel below it completes a turn.
+Adding and cancelling a timer are O(1), a cancelled timer is dropped from its
+slot right away, and all timers of a tick expire together as one batch.
+
+A timer never fires early, and at most one tick late.
+
+    python timer_wheel.py [timers] [cancelled_share]
+
+compares the wheel against a heapq of (deadline, seq, handle) entries, where a
+cancelled entry can only be flagged and stays in the heap until it is popped.
+99% of a million 30-60 s idle timeouts cancelled:
+
+    heapq | 1000000 timers | add  1.43 s | cancel  0.04 s | expire  3.71 s | retained after cancel 164.3 MB
+    wheel | 1000000 timers | add  2.86 s | cancel  0.48 s | expire  0.13 s | retained after cancel  34.2 MB
+
+What the wheel still retains is mostly slot dicts, which keep their size after
+the deletions and get reused by the following timers.
+"""
+import heapq
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+SLOT_BITS = 8
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+LEVELS = 4
+MAX_DELTA = (1 << (SLOT_BITS * LEVELS)) - 1
+RESOLUTION = .001
+
+
+class TimerHandle:
+    __slots__ = ('tick', 'callback', 'args', 'cancelled', '_wheel', '_slot', '_level')
+
+    def __init__(self, tick: int, callback: Callable[..., Any], args: tuple, wheel: 'TimerWheel'):
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self._wheel = wheel
+        self._slot: Optional[Dict['TimerHandle', None]] = None
+        self._level = 0
+
+    def cancel(self) -> None:
+        if self.cancelled:
+            return
+        self.cancelled = True
+        if self._slot is not None:
+            del self._slot[self]
+            self._slot = None
+            self._wheel._unlinked(self._level)
+        self.callback = None
+        self.args = None
+
+    def when(self) -> float:
+        """The deadline rounded up to the wheel's tick, on the wheel's clock."""
+        return self.tick * self._wheel._resolution
+
+    def __call__(self) -> None:
+        if not self.cancelled:
+            self.callback(*self.args)
+
+
+class TimerWheel:
+
+    def __init__(self, resolution: float = RESOLUTION, clock: Callable[[], float] = time.monotonic):
+        self._resolution = resolution
+        self._clock = clock
+        self._tick = self._to_tick(clock())
+        self._wheels = [[{} for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self._level_counts = [0] * LEVELS
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _to_tick(self, moment: float) -> int:
+        return int(moment / self._resolution)
+
+    def _unlinked(self, level: int) -> None:
+        self._level_counts[level] -= 1
+        self._count -= 1
+
+    def _link(self, handle: TimerHandle) -> None:
+        delta = handle.tick - self._tick
+        if delta < 1:
+            # The current tick's slot has already been expired.
+            delta = 1
+        elif delta > MAX_DELTA:
+            delta = MAX_DELTA
+        target = self._tick + delta
+        level = (delta.bit_length() - 1) // SLOT_BITS
+        slot = self._wheels[level][(target >> (SLOT_BITS * level)) & SLOT_MASK]
+        slot[handle] = None
+        handle._slot = slot
+        handle._level = level
+        self._level_counts[level] += 1
+        self._count += 1
+
+    def call_at(self, deadline: float, callback: Callable[..., Any], *args) -> TimerHandle:
+        # Rounding the deadline up keeps timers from firing before it.
+        tick = -int(-deadline // self._resolution)
+        handle = TimerHandle(tick, callback, args, self)
+        self._link(handle)
+        return handle
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args) -> TimerHandle:
+        return self.call_at(self._clock() + delay, callback, *args)
+
+    def _cascade(self, tick: int) -> None:
+        for level in range(LEVELS - 1, 0, -1):
+            if tick & ((1 << (SLOT_BITS * level)) - 1) or not self._level_counts[level]:
+                continue
+            index = (tick >> (SLOT_BITS * level)) & SLOT_MASK
+            slot = self._wheels[level][index]
+            if not slot:
+                continue
+            self._wheels[level][index] = {}
+            self._level_counts[level] -= len(slot)
+            self._count -= len(slot)
+            for handle in slot:
+                self._link(handle)
+
+    def expire(self, now: Optional[float] = None) -> List[TimerHandle]:
+        """Advance the wheel to `now` and return every timer that got due, in order."""
+        target = self._to_tick(self._clock() if now is None else now)
+        expired = []
+        while self._tick < target:
+            if not self._count:
+                self._tick = target
+                break
+            if not self._level_counts[0]:
+                # Nothing can expire before the next turn of level 0.
+                boundary = (self._tick | SLOT_MASK) + 1
+                if boundary > target:
+                    self._tick = target
+                    break
+                self._tick = boundary - 1
+            self._tick += 1
+            self._cascade(self._tick)
+            index = self._tick & SLOT_MASK
+            slot = self._wheels[0][index]
+            if slot:
+                self._wheels[0][index] = {}
+                self._level_counts[0] -= len(slot)
+                self._count -= len(slot)
+                for handle in slot:
+                    handle._slot = None
+                expired.extend(slot)
+        return expired
+
+    def next_timeout(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the earliest pending slot, None when the wheel is empty.
+
+        A slot of a higher level is due when the ticks reach its start, where it
+        is cascaded; expire() cascades every slot it passes, so the levels in
+        between never need a wake-up of their own.
+        """
+        if not self._count:
+            return None
+        next_tick = None
+        for level in range(LEVELS):
+            if not self._level_counts[level]:
+                continue
+            shift = SLOT_BITS * level
+            position = self._tick >> shift
+            wheel = self._wheels[level]
+            # The slot under the current position only holds timers a full turn ahead.
+            for ahead in range(1, SLOTS + 1):
+                if wheel[(position + ahead) & SLOT_MASK]:
+                    start = (position + ahead) << shift
+                    if next_tick is None or start < next_tick:
+                        next_tick = start
+                    break
+        now = self._clock() if now is None else now
+        timeout = next_tick * self._resolution - now
+        return timeout if timeout > 0 else 0
+
+
+def bench_heap(deadlines: List[float], cancelled_share: float) -> List[float]:
+    heap = []
+    handles = []
+    start_time = time.perf_counter()
+    for seq, deadline in enumerate(deadlines):
+        handle = [deadline, False]
+        heapq.heappush(heap, (deadline, seq, handle))
+        handles.append(handle)
+    added = time.perf_counter()
+    for handle in handles[:int(len(handles) * cancelled_share)]:
+        handle[1] = True
+    cancelled = time.perf_counter()
+    handles = None
+    retained = tracemalloc.get_traced_memory()[0]
+    while heap:
+        _, _, handle = heapq.heappop(heap)
+        if not handle[1]:
+            pass
+    expired = time.perf_counter()
+    return [added - start_time, cancelled - added, expired - cancelled, retained]
+
+
+def bench_wheel(deadlines: List[float], cancelled_share: float) -> List[float]:
+    wheel = TimerWheel(clock=lambda: 0.0)
+    handles = []
+    start_time = time.perf_counter()
+    for deadline in deadlines:
+        handles.append(wheel.call_at(deadline, int))
+    added = time.perf_counter()
+    for handle in handles[:int(len(handles) * cancelled_share)]:
+        handle.cancel()
+    cancelled = time.perf_counter()
+    handles = None
+    retained = tracemalloc.get_traced_memory()[0]
+    wheel.expire(now=max(deadlines) + 1)
+    expired = time.perf_counter()
+    return [added - start_time, cancelled - added, expired - cancelled, retained]
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:] + [None] * 2
+    timers_count = int(args[0] or 10 ** 6)
+    share = float(args[1] or .99)
+    random.seed(1729)
+    # Idle timeouts of 30-60 s, a million connections.
+    timer_deadlines = [random.uniform(30, 60) for _ in range(timers_count)]
+    for name, bench in (('heapq', bench_heap), ('wheel', bench_wheel)):
+        # Timings come from an untraced run, tracemalloc would slow both down.
+        add, cancel, expire, _ = bench(timer_deadlines, share)
+        tracemalloc.start()
+        retained = bench(timer_deadlines, share)[-1]
+        tracemalloc.stop()
+        print(
+            f'{name} | {timers_count} timers | add {add:5.2f} s | cancel {cancel:5.2f} s | '
+            f'expire {expire:5.2f} s | retained after cancel {retained / 2 ** 20:5.1f} MB'
+        )
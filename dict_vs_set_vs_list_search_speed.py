@@ -34,118 +34,424 @@ not to be in haystack)
 500 500 500 500 500 |   100_000 | 516733338 ns
 500 500 500 500 500 | 1_000_000 | 5771800301 ns
 500 500 500 500 500 |10_000_000 | 58452294214 ns  | 300k (!) times slower than dict
+
+Batched containers answer the whole needle batch in one call:
+numpy-isin (np.isin), sorted-array (np.searchsorted over a sorted
+copy) and bisect (sorted array('d'), needles sorted so that each
+bisect_left starts where the previous one ended). The numpy ones
+need numpy installed.
+
+                    BISECT
+
+500 500 500 500 500 |    1000 | 382072 ns
+500 500 500 500 500 |   10000 | 520236 ns
+500 500 500 500 500 |  100000 | 562343 ns
+500 500 500 500 500 | 1000000 | 735749 ns
+500 500 500 500 500 |10000000 | 1057421 ns    | 5 times slower than dict
+
+Still a bisect_left call per needle with log(n) comparisons of
+boxed floats where dict does one hash probe; the gain is memory:
+8 bytes per element against a boxed float and a table slot.
+
+The haystack file is mapped once and every size is a zero-copy slice
+of it; setup time and the process' peak RSS (mapped pages included)
+are printed next to the search time. For dict/set/list setup stays
+dominated by boxing the floats: about 4 s and 650 MB at 10^7 for set.
+
+    python dict_vs_set_vs_list_search_speed.py [-v] [--seed N] [--jobs N] [--pin]
+                                               [--history PATH] CONTAINER... | all
+
+generates the haystack on the first run for a seed (1.5 s for 10^7
+floats without numpy, single core) and reuses the cached files after.
+
+Each (container, size) cell runs in its own process, --jobs at a time,
+pinned to a core each with --pin. A cell warms up, sizes its samples
+to 10 ms and reports median, mean with its 95% confidence interval
+and relative stdev over up to 30 samples (samples x calls per sample).
+Memory columns: time to build the container, tracemalloc peak while
+building it (a separate build), the size it retains with its boxed
+floats, and bytes per element. At 10^7:
+
+    dict | median 195153 ns | build 5198 ms | traced peak 608.0 MB | retained 548.9 MB | 57.6 B/element
+     set | median 188470 ns | build 4315 ms | traced peak 499.2 MB | retained 484.9 MB | 50.8 B/element
+  bisect | median 748926 ns | build 7075 ms | traced peak 381.5 MB | retained  76.3 MB |  8.0 B/element
+
+and list at 10^6: median 10.4 s | retained 30.5 MB | 32.0 B/element.
+
+float-hash-set (float_hash_set.FloatHashSet) keeps the raw doubles in
+an open-addressing array('d'); without numpy its lookups run a Python
+loop:
+
+    float-hash-set | median 773009 ns | build 9207 ms | traced peak 127.2 MB | retained 127.2 MB | 13.3 B/element
+
+bloom-<container> puts a bloom_filter.BloomFilter (--fp-rate, 1% by
+default) in front of dict, set, list, bisect or sorted-array; only the
+needles that pass it are looked up. The filter adds 1.2 bytes per
+element at 1%. Its Python probe loop costs about 1.2 us per needle,
+more than the lookups of set and bisect it is meant to spare, so
+without numpy only the list gains:
+
+          set |    10000 | median    236801 ns
+    bloom-set |    10000 | median   1452289 ns | filter 0.0 MB, 505 of 1000 needles passed
+         list |    10000 | median 241171965 ns
+   bloom-list |    10000 | median  91775349 ns | filter 0.0 MB, 505 of 1000 needles passed
+
+Every run is appended to auxiliary/search_speed_history.json, and
+
+    python dict_vs_set_vs_list_search_speed.py --compare [OLD NEW]
+
+compares two runs of it (the last two by default) with Welch's t-test,
+flagging changes of the mean over 5% that are significant, and exits
+with 1 when anything regressed, 2 when the history lacks the runs.
 """
 
+import bisect
+import hashlib
+import mmap
+import os
 import sys
 import time
+import tracemalloc
 from array import array
-from functools import wraps
-from random import (
-    random, uniform
-)
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress
+from random import Random
 from typing import (
-    List, Set, Dict, Union, Callable
+    List, Set, Dict, Union
 )
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import benchmark_runner
+from bloom_filter import FP_RATE, BloomFilter
+from float_hash_set import FloatHashSet
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 MIN_EXPONENT = 3
 MAX_EXPONENT = 7
 HAYSTACK_SCOPE = 10 ** MAX_EXPONENT
 NEEDLES_SCOPE = 500
+SEED = 1729
+GENERATION_CHUNK = 10 ** 6
+NUMPY_CONTAINERS = ('numpy-isin', 'sorted-array')
+BATCH_CONTAINERS = NUMPY_CONTAINERS + ('bisect', 'float-hash-set')
+BLOOM_PREFIX = 'bloom-'
+BLOOM_CONTAINERS = tuple(BLOOM_PREFIX + backend for backend in ('dict', 'set', 'list', 'bisect', 'sorted-array'))
+CONTAINERS = ('dict', 'set', 'list') + BATCH_CONTAINERS + BLOOM_CONTAINERS
+HISTORY_PATH = 'auxiliary/search_speed_history.json'
 
 
-def ns_timer(execute_times: int = 1) -> Callable[[Callable[[...], None]], Callable[[...], List[int]]]:
-    def outer(func: Callable[[...], None]) -> Callable[[...], List[int]]:
-        @wraps(func)
-        def inner(*args, **kwargs) -> List[int]:
-            measurements = []
-            for i in range(execute_times):
-                start_time = time.perf_counter_ns()
-                func(*args, **kwargs)
-                exe_time = time.perf_counter_ns() - start_time
-                measurements.append(exe_time)
-            return measurements
-
-        return inner
-
-    return outer
+def _fill_chunk(path: str, seed: int, start: int, count: int) -> None:
+    # Every chunk has its own stream, so the file does not depend on how many workers wrote it.
+    random = Random(f'{seed}-{start}').random
+    with open(path, mode='r+b') as f:
+        f.seek(start * array('d').itemsize)
+        array('d', [random() for _ in range(count)]).tofile(f)
 
 
 class RandomFloatsGenerator:
+    """Haystack and needles files, generated once per (seed, scopes) and reused afterwards.
+
+    The files are named after a hash of the parameters and of the backend that
+    made them: numpy's Generator.random, or without numpy chunks of Random
+    streams written by a process pool into disjoint regions of one file.
+    """
 
     def __init__(self, haystack_scope: int = HAYSTACK_SCOPE,
-                 needles_scope: int = NEEDLES_SCOPE):
+                 needles_scope: int = NEEDLES_SCOPE, seed: int = SEED):
         self._haystack_scope = haystack_scope
         self._needles_scope = needles_scope
-        self._load_haystack_and_needles_to_files()
+        self._seed = seed
+        backend = 'numpy' if np is not None else 'random'
+        key = hashlib.sha256(
+            f'{backend}:{seed}:{haystack_scope}:{needles_scope}'.encode()
+        ).hexdigest()[:16]
+        self.haystack_path = f'auxiliary/haystack-{key}.arr'
+        self.needles_path = f'auxiliary/needles-{key}.arr'
+        self.cached = os.path.exists(self.haystack_path) and os.path.exists(self.needles_path)
+        if not self.cached:
+            self._load_haystack_and_needles_to_files()
 
-    def _get_haystack_and_needles(self):
-        haystack_arr = array('d', [random() for _ in range(self._haystack_scope)])
-        needles_arr = array('d', [uniform(1, 2) for _ in range(self._needles_scope)])
-        return haystack_arr, needles_arr
+    def _write_haystack(self, path: str) -> None:
+        if np is not None:
+            with open(path, mode='wb') as f:
+                np.random.default_rng(self._seed).random(self._haystack_scope).tofile(f)
+            return
+        with open(path, mode='wb') as f:
+            f.truncate(self._haystack_scope * array('d').itemsize)
+        starts = range(0, self._haystack_scope, GENERATION_CHUNK)
+        with ProcessPoolExecutor() as pool:
+            list(pool.map(
+                _fill_chunk, [path] * len(starts), [self._seed] * len(starts), starts,
+                [min(GENERATION_CHUNK, self._haystack_scope - start) for start in starts]
+            ))
+
+    def _get_needles(self) -> array:
+        uniform = Random(f'{self._seed}-needles').uniform
+        return array('d', [uniform(1, 2) for _ in range(self._needles_scope)])
 
     def _load_haystack_and_needles_to_files(self):
-        haystack, needles = self._get_haystack_and_needles()
-        with open('auxiliary/haystack.arr', mode='wb') as f:
-            haystack.tofile(f)
-        with open('auxiliary/needles.arr', mode='wb') as f:
-            needles.tofile(f)
+        # Written under temporary names, so an interrupted run leaves no half-made cache.
+        self._write_haystack(self.haystack_path + '.tmp')
+        with open(self.needles_path + '.tmp', mode='wb') as f:
+            self._get_needles().tofile(f)
+        os.replace(self.haystack_path + '.tmp', self.haystack_path)
+        os.replace(self.needles_path + '.tmp', self.needles_path)
+
+
+def map_floats(path: str) -> memoryview:
+    """Doubles of a file as a read-only memoryview over an mmap; slicing it copies nothing."""
+    with open(path, mode='rb') as f:
+        # The map stays valid after the file is closed and lives as long as the view.
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped).cast('d')
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return float('nan')
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def retained_size(haystack) -> int:
+    """Bytes a container keeps alive, its own elements included."""
+    size = sys.getsizeof(haystack)
+    if isinstance(haystack, tuple):
+        # A Bloom filter and the container behind it.
+        return sum(map(retained_size, haystack))
+    if isinstance(haystack, (dict, set, list)):
+        # Iterating a dict gives its keys; the values are all the same cached 0.
+        return size + sum(map(sys.getsizeof, haystack))
+    if np is not None and isinstance(haystack, np.ndarray) and haystack.base is not None:
+        # A view over the mapped file: the pages still have to stay resident.
+        return size + haystack.nbytes
+    return size
 
 
 class ContainersTester:
 
-    @staticmethod
-    def _set_up_data(container_type: str, size: int):
-        haystack = None
-        floats = array('d')
-        with open('auxiliary/haystack.arr', mode='rb') as f:
-            floats.fromfile(f, size)
+    def __init__(self, haystack_path: str, needles_path: str, fp_rate: float = FP_RATE):
+        self._floats = map_floats(haystack_path)
+        self._needles = array('d')
+        with open(needles_path, mode='rb') as f:
+            self._needles.fromfile(f, NEEDLES_SCOPE)
+        self._fp_rate = fp_rate
+
+    def _build(self, container_type: str, floats: memoryview):
+        if container_type.startswith(BLOOM_PREFIX):
+            return (
+                BloomFilter.from_floats(floats, self._fp_rate),
+                self._build(container_type[len(BLOOM_PREFIX):], floats),
+            )
+        if container_type in NUMPY_CONTAINERS and np is None:
+            raise SystemExit(f'{container_type} needs numpy installed')
 
         if container_type == 'dict':
-            haystack = dict.fromkeys(floats, 0)
+            return dict.fromkeys(floats, 0)
         if container_type == 'set':
-            haystack = set(floats)
+            return set(floats)
         if container_type == 'list':
-            haystack = list(floats)
+            return list(floats)
+        if container_type == 'numpy-isin':
+            return np.frombuffer(floats, dtype=np.float64)
+        if container_type == 'sorted-array':
+            return np.sort(np.frombuffer(floats, dtype=np.float64))
+        if container_type == 'bisect':
+            return array('d', sorted(floats))
+        if container_type == 'float-hash-set':
+            return FloatHashSet(floats)
+        return None
+
+    def _set_up_data(self, container_type: str, size: int):
+        floats = self._floats[:size]
+        haystack = self._build(container_type, floats)
 
-        needles = array('d')
-        with open('auxiliary/needles.arr', mode='rb') as f:
-            needles.fromfile(f, NEEDLES_SCOPE)
+        needles = array('d', self._needles)
         needles.extend(floats[::size // 500])
 
         return haystack, needles
 
-    @ns_timer(execute_times=5)
-    def _search_needles(self, haystack: Union[Dict, Set, List],
-                        needles: array, verbose: bool):
+    @staticmethod
+    def _search_needles(haystack: Union[Dict, Set, List], needles: array) -> int:
         found_count = 0
         for needle in needles:
             if needle in haystack:
                 found_count += 1
-        if verbose:
-            print(found_count, end=' ')
+        return found_count
+
+    @staticmethod
+    def _contains_many(container_type: str, haystack, needles: array) -> int:
+        """Count the needles found in the haystack, answering the whole batch in one call."""
+        if container_type == 'numpy-isin':
+            return int(np.isin(np.frombuffer(needles, dtype=np.float64), haystack).sum())
+        if container_type == 'sorted-array':
+            batch = np.frombuffer(needles, dtype=np.float64)
+            positions = np.searchsorted(haystack, batch)
+            positions[positions == len(haystack)] = 0
+            return int((haystack[positions] == batch).sum())
+        if container_type == 'float-hash-set':
+            return sum(haystack.contains_many(needles))
+        # bisect: with the needles sorted every search starts where the previous one ended.
+        found_count = 0
+        low = 0
+        high = len(haystack)
+        for needle in sorted(needles):
+            low = bisect.bisect_left(haystack, needle, low, high)
+            if low == high:
+                break
+            if haystack[low] == needle:
+                found_count += 1
+        return found_count
+
+    def _search(self, container_type: str, haystack, needles: array) -> int:
+        if container_type.startswith(BLOOM_PREFIX):
+            # Only what passes the filter reaches the container behind it.
+            bloom, haystack = haystack
+            needles = array('d', compress(needles, bloom.might_contain_many(needles)))
+            container_type = container_type[len(BLOOM_PREFIX):]
+        if container_type in BATCH_CONTAINERS:
+            return self._contains_many(container_type, haystack, needles)
+        return self._search_needles(haystack, needles)
+
+    def measure_cell(self, container_type: str, size: int) -> Dict:
+        build_start = time.perf_counter_ns()
+        haystack, needles = self._set_up_data(container_type, size)
+        build_time = time.perf_counter_ns() - build_start
+        retained = retained_size(haystack)
+
+        search, args = self._search, (container_type, haystack, needles)
+        cell = {
+            'container': container_type,
+            'size': size,
+            'found': search(*args),
+            'build_ms': build_time / 10 ** 6,
+            'retained_mb': retained / 2 ** 20,
+            'bytes_per_element': retained / size,
+        }
+        if container_type.startswith(BLOOM_PREFIX):
+            cell['filter_mb'] = sys.getsizeof(haystack[0]) / 2 ** 20
+            cell['filter_passed'] = sum(haystack[0].might_contain_many(needles))
+        cell.update(benchmark_runner.measure(search, *args))
+        cell['peak_rss_mb'] = peak_rss_mb()
+
+        # A second build under tracemalloc gives the peak, after everything else:
+        # the traces themselves take more memory than most containers.
+        haystack = needles = search = args = None
+        tracemalloc.start()
+        self._set_up_data(container_type, size)
+        cell['build_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+        return cell
 
     def test_container_speed(self, container_type: str, verbose: bool):
         for n in range(MIN_EXPONENT, MAX_EXPONENT + 1):
-            size = 10 ** n
-            haystack, needles = self._set_up_data(container_type, size)
-            results = self._search_needles(haystack=haystack,
-                                           needles=needles,
-                                           verbose=verbose)
-            print(
-                '|{:{}d} | {} ns'.format(size, MAX_EXPONENT + 1, min(results))
-            )
+            print(format_cell(self.measure_cell(container_type, 10 ** n), verbose))
 
 
-if __name__ == '__main__':
+def measure_cell(haystack_path: str, needles_path: str, container_type: str, size: int,
+                 fp_rate: float = FP_RATE) -> Dict:
+    return ContainersTester(haystack_path, needles_path, fp_rate).measure_cell(container_type, size)
+
+
+def format_cell(cell: Dict, verbose: bool = False) -> str:
+    return '{}{:>12} |{:{}d} | median {:>12.0f} ns | mean {:>12.0f} ± {:>9.0f} ns | ' \
+           'stdev {:>5.1%} | {:>2d} x {:<5d} | build {:>6.0f} ms | traced peak {:>7.1f} MB | ' \
+           'retained {:>7.1f} MB | {:>5.1f} B/element | peak rss {:.1f} MB'.format(
+               f'{cell["found"]:>4} found ' if verbose else '',
+               cell['container'], cell['size'], MAX_EXPONENT + 1,
+               cell['median'], cell['mean'], cell['ci95'], cell['stdev'] / cell['mean'],
+               len(cell['samples']), cell['loops'], cell['build_ms'], cell['build_peak_mb'],
+               cell['retained_mb'], cell['bytes_per_element'], cell['peak_rss_mb']
+           ) + (
+               ' | filter {:.1f} MB, {} of {} needles passed'.format(
+                   cell['filter_mb'], cell['filter_passed'], 2 * NEEDLES_SCOPE
+               ) if 'filter_mb' in cell else ''
+           )
+
+
+def compare_runs(old_run: Dict, new_run: Dict) -> bool:
+    """Print every cell the two runs share; True when any of them regressed."""
+    regressed = False
+    old_cells = {(cell['container'], cell['size']): cell for cell in old_run['cells']}
+    for new_cell in new_run['cells']:
+        old_cell = old_cells.get((new_cell['container'], new_cell['size']))
+        if old_cell is None:
+            continue
+        verdict = benchmark_runner.compare(old_cell, new_cell)
+        regressed = regressed or verdict == 'regression'
+        print('{:>12} |{:{}d} | {:>12.0f} -> {:>12.0f} ns | {:>+7.1%} | {}'.format(
+            new_cell['container'], new_cell['size'], MAX_EXPONENT + 1,
+            old_cell['mean'], new_cell['mean'], new_cell['mean'] / old_cell['mean'] - 1, verdict
+        ))
+    return regressed
 
-    generator = RandomFloatsGenerator()
-    tester = ContainersTester()
+
+def pop_option(name: str, default=None):
+    if name not in sys.argv:
+        return default
+    position = sys.argv.index(name)
+    value = sys.argv.pop(position + 1)
+    sys.argv.pop(position)
+    return value
+
+
+if __name__ == '__main__':
 
     verbosity_flag = False
     if '-v' in sys.argv:
         verbosity_flag = True
         sys.argv.remove('-v')
-    tester.test_container_speed(
-        container_type=sys.argv[1],
-        verbose=verbosity_flag
-    )
+    pinning_flag = False
+    if '--pin' in sys.argv:
+        pinning_flag = True
+        sys.argv.remove('--pin')
+    seed = int(pop_option('--seed', SEED))
+    jobs = int(pop_option('--jobs', 0)) or None
+    history_path = pop_option('--history', HISTORY_PATH)
+    fp_rate = float(pop_option('--fp-rate', FP_RATE))
+
+    if '--compare' in sys.argv:
+        history = benchmark_runner.load_history(history_path)
+        runs = [int(index) for index in sys.argv[sys.argv.index('--compare') + 1:]] or [-2, -1]
+        try:
+            old_run, new_run = history[runs[0]], history[runs[1]]
+        except IndexError:
+            print(f'{history_path} holds {len(history)} runs, not the two to compare', file=sys.stderr)
+            sys.exit(2)
+        sys.exit(compare_runs(old_run, new_run))
+
+    containers = sys.argv[1:] if sys.argv[1:] != ['all'] else list(CONTAINERS)
+    for container in containers:
+        if container not in CONTAINERS:
+            sys.exit(f'unknown container {container}, expected one of {", ".join(CONTAINERS)}')
+        if container.replace(BLOOM_PREFIX, '', 1) in NUMPY_CONTAINERS and np is None:
+            sys.exit(f'{container} needs numpy installed')
+
+    start_time = time.perf_counter()
+    generator = RandomFloatsGenerator(seed=seed)
+    print('{} {} in {:.2f} s'.format(
+        'reused' if generator.cached else 'generated',
+        generator.haystack_path, time.perf_counter() - start_time
+    ))
+    cells = [
+        (generator.haystack_path, generator.needles_path, container, 10 ** n, fp_rate)
+        for container in containers
+        for n in range(MIN_EXPONENT, MAX_EXPONENT + 1)
+    ]
+    run = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seed': seed,
+        'python': sys.version.split()[0],
+        'fp_rate': fp_rate,
+        'cells': [],
+    }
+    for result in benchmark_runner.run_cells(measure_cell, cells, jobs=jobs, pin=pinning_flag):
+        print(format_cell(result, verbosity_flag))
+        run['cells'].append(result)
+    benchmark_runner.append_run(history_path, run)
@@ -1,9 +1,12 @@
+import io
 import sys
 import re
 from typing import (
     Dict, List, Tuple
 )
 
+from dicts_defaultdict_and_counter import map_line_ranges
+
 
 class TxtExecutor:
 
@@ -13,23 +16,41 @@ class TxtExecutor:
         self._file_path = file_path
         self._words_location: Dict = {}
 
-    def get_words_location(self) -> Dict[str, List[Tuple[int]]]:
-        with open(self._file_path, encoding='utf-8', mode='r') as file:
-            for line_no, line in enumerate(file, start=1):
-                for match in self.WORD_RE.finditer(line):
-                    current_word = match.group()
-                    row = line_no
-                    column = match.start() + 1
-                    self._words_location.setdefault(current_word, []).append((row, column))
+    def _index_lines(self, lines, first_row: int = 1) -> None:
+        for line_no, line in enumerate(lines, start=first_row):
+            for match in self.WORD_RE.finditer(line):
+                current_word = match.group()
+                row = line_no
+                column = match.start() + 1
+                self._words_location.setdefault(current_word, []).append((row, column))
+
+    def get_words_location(self, workers: int = 1) -> Dict[str, List[Tuple[int]]]:
+        if workers == 1:
+            with open(self._file_path, encoding='utf-8', mode='r') as file:
+                self._index_lines(file)
+        else:
+            # Partial maps come back in file order, so extending keeps every list sorted.
+            for part in map_line_ranges(_index_range, self._file_path, workers, with_rows=True):
+                for word, locations in part.items():
+                    self._words_location.setdefault(word, []).extend(locations)
 
         return self._words_location
 
 
+def _index_range(file_path: str, start: int, stop: int, first_row: int) -> Dict[str, List[Tuple[int]]]:
+    with open(file_path, mode='rb') as file:
+        file.seek(start)
+        data = file.read(stop - start)
+    executor = TxtExecutor(file_path)
+    executor._index_lines(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8'), first_row)
+    return executor._words_location
+
+
 if __name__ == '__main__':
 
     file_to_read = sys.argv[1]
     exe = TxtExecutor(file_to_read)
-    words_dict = exe.get_words_location()
+    words_dict = exe.get_words_location(int(sys.argv[2]) if len(sys.argv) > 2 else 1)
 
     for word in sorted(
             words_dict,
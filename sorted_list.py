@@ -0,0 +1,254 @@
+"""Sorted list kept as a list of short sorted lists.
+
+bisect.insort into one list moves everything after the insertion point, so n
+inserts cost O(n^2) memory moves. SortedList keeps its values in chunks of
+at most 2 * LOAD, with the maximum of every chunk in a separate list: an add
+bisects the maxima, then insorts into one short chunk, and a chunk that grows
+too long is split in two. Positions (indexing, bisect, index) go through a
+Fenwick tree over the chunk lengths, updated in O(log chunks) by add and
+remove and rebuilt only after a split or a dropped chunk.
+
+    python sorted_list.py [max_exponent]
+
+inserts 10^4 .. 10^max_exponent (7 by default) random ints one by one.
+bisect.insort is only run up to 10^5, past that it would take hours:
+
+     inserts |  bisect.insort |  SortedList.add
+       10000 |         0.02 s |          0.02 s
+      100000 |         1.06 s |          0.15 s
+     1000000 |              - |          2.79 s
+    10000000 |              - |         41.92 s
+"""
+import bisect
+import random
+import sys
+import time
+from itertools import chain
+from typing import Any, Iterable, Iterator, List, Optional
+
+LOAD = 1000
+INSORT_LIMIT = 10 ** 5
+
+
+class SortedList:
+
+    def __init__(self, iterable: Iterable = ()):
+        self._lists: List[list] = []
+        self._maxes: List[Any] = []
+        self._len = 0
+        self._tree: Optional[List[int]] = None
+        self.update(iterable)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(self._lists)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({list(self)!r})'
+
+    def __contains__(self, value) -> bool:
+        position = bisect.bisect_left(self._maxes, value)
+        if position == len(self._maxes):
+            return False
+        chunk = self._lists[position]
+        index = bisect.bisect_left(chunk, value)
+        return chunk[index] == value
+
+    # Fenwick tree over the chunk lengths.
+
+    def _build_tree(self) -> List[int]:
+        tree = [0] + [len(chunk) for chunk in self._lists]
+        for node in range(1, len(tree)):
+            parent = node + (node & -node)
+            if parent < len(tree):
+                tree[parent] += tree[node]
+        self._tree = tree
+        return tree
+
+    def _tree_add(self, chunk_index: int, delta: int) -> None:
+        tree = self._tree
+        if tree is None:
+            return
+        node = chunk_index + 1
+        while node < len(tree):
+            tree[node] += delta
+            node += node & -node
+
+    def _offset(self, chunk_index: int) -> int:
+        """How many values sit in the chunks before chunk_index."""
+        tree = self._tree or self._build_tree()
+        total = 0
+        node = chunk_index
+        while node:
+            total += tree[node]
+            node -= node & -node
+        return total
+
+    def _locate(self, index: int):
+        """Chunk and position within it of the value at a global index."""
+        tree = self._tree or self._build_tree()
+        chunk_index = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            node = chunk_index + step
+            if node < len(tree) and tree[node] <= index:
+                index -= tree[node]
+                chunk_index = node
+            step >>= 1
+        return chunk_index, index
+
+    # Updates.
+
+    def add(self, value) -> None:
+        maxes = self._maxes
+        if not maxes:
+            self._lists.append([value])
+            maxes.append(value)
+            self._len = 1
+            self._tree = None
+            return
+        position = bisect.bisect_right(maxes, value)
+        if position == len(maxes):
+            position -= 1
+            self._lists[position].append(value)
+            maxes[position] = value
+        else:
+            bisect.insort(self._lists[position], value)
+        self._len += 1
+        self._tree_add(position, 1)
+        if len(self._lists[position]) > 2 * LOAD:
+            self._split(position)
+
+    def _split(self, position: int) -> None:
+        chunk = self._lists[position]
+        half = chunk[LOAD:]
+        del chunk[LOAD:]
+        self._lists.insert(position + 1, half)
+        self._maxes[position] = chunk[-1]
+        self._maxes.insert(position + 1, half[-1])
+        self._tree = None
+
+    def remove(self, value) -> None:
+        position = bisect.bisect_left(self._maxes, value)
+        if position < len(self._maxes):
+            chunk = self._lists[position]
+            index = bisect.bisect_left(chunk, value)
+            if chunk[index] == value:
+                self._delete(position, index)
+                return
+        raise ValueError(f'{value!r} not in list')
+
+    def discard(self, value) -> None:
+        try:
+            self.remove(value)
+        except ValueError:
+            pass
+
+    def _delete(self, position: int, index: int) -> None:
+        chunk = self._lists[position]
+        del chunk[index]
+        self._len -= 1
+        if chunk:
+            self._maxes[position] = chunk[-1]
+            self._tree_add(position, -1)
+        else:
+            del self._lists[position]
+            del self._maxes[position]
+            self._tree = None
+
+    def update(self, iterable: Iterable) -> None:
+        values = list(iterable)
+        if not values:
+            return
+        if len(values) * 4 < self._len:
+            for value in values:
+                self.add(value)
+            return
+        # A big batch is cheaper to sort in with everything than to add one by one.
+        values = sorted(chain(self, values))
+        self._lists = [values[start:start + LOAD] for start in range(0, len(values), LOAD)]
+        self._maxes = [chunk[-1] for chunk in self._lists]
+        self._len = len(values)
+        self._tree = None
+
+    def pop(self, index: int = -1):
+        if not self._len:
+            raise IndexError('pop from empty list')
+        value = self[index]
+        position, offset = self._locate(index % self._len)
+        self._delete(position, offset)
+        return value
+
+    # Positions.
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('list index out of range')
+        position, offset = self._locate(index)
+        return self._lists[position][offset]
+
+    def bisect_left(self, value) -> int:
+        position = bisect.bisect_left(self._maxes, value)
+        if position == len(self._maxes):
+            return self._len
+        return self._offset(position) + bisect.bisect_left(self._lists[position], value)
+
+    def bisect_right(self, value) -> int:
+        position = bisect.bisect_right(self._maxes, value)
+        if position == len(self._maxes):
+            return self._len
+        return self._offset(position) + bisect.bisect_right(self._lists[position], value)
+
+    bisect = bisect_right
+
+    def index(self, value) -> int:
+        position = self.bisect_left(value)
+        if position == self._len or self[position] != value:
+            raise ValueError(f'{value!r} not in list')
+        return position
+
+    def irange(self, minimum, maximum) -> Iterator:
+        """Values v with minimum <= v <= maximum, in order."""
+        position = bisect.bisect_left(self._maxes, minimum)
+        if position == len(self._maxes):
+            return
+        start = bisect.bisect_left(self._lists[position], minimum)
+        for chunk in self._lists[position:]:
+            for value in chunk[start:]:
+                if value > maximum:
+                    return
+                yield value
+            start = 0
+
+
+def bench(max_exponent: int) -> None:
+    print(' inserts |  bisect.insort |  SortedList.add')
+    for exponent in range(4, max_exponent + 1):
+        count = 10 ** exponent
+        rnd = random.Random(1729)
+        values = [rnd.randrange(count * 10) for _ in range(count)]
+        insort_time = None
+        if count <= INSORT_LIMIT:
+            plain = []
+            start_time = time.perf_counter()
+            for value in values:
+                bisect.insort(plain, value)
+            insort_time = time.perf_counter() - start_time
+        chunked = SortedList()
+        start_time = time.perf_counter()
+        for value in values:
+            chunked.add(value)
+        add_time = time.perf_counter() - start_time
+        if insort_time is not None:
+            assert list(chunked) == plain
+        print('{:>8} | {:>14} | {:>13.2f} s'.format(
+            count, '-' if insort_time is None else f'{insort_time:.2f} s', add_time
+        ))
+
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 7)